@@ -1,9 +1,8 @@
 import streamlit as st
 import requests
 import json
-from datetime import datetime
+import time
 import os
-from  documentprocessor import maindocprocesser , mainwebprocess
 # Set page config
 st.set_page_config(
     page_title="Chat with your Docuuments(AI-Based Document RAG system)",
@@ -15,52 +14,109 @@ st.set_page_config(
 
 
 # FastAPI integration for OLLAMA
-def query_ollama_via_fastapi(query):
-    """Query OLLAMA through FastAPI backend"""
+def stream_ollama_via_fastapi(query):
+    """Yield answer events from the FastAPI streaming endpoint as they arrive"""
+    fastapi_url = st.session_state.get('fastapi_url', 'http://127.0.0.1:8000')
+
+    payload = {
+        "requesttext": query,
+        "collection": st.session_state.get('collection') or None
+    }
+
+    with requests.post(
+        f"{fastapi_url}/submit_query_stream",
+        json=payload,
+        stream=True,
+        timeout=600
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def render_streamed_answer(query):
+    """Render sources and then tokens of a streamed answer as they come in"""
+    st.subheader("Response:")
+    sources_placeholder = st.empty()
+    answer_placeholder = st.empty()
+    answer = ""
+    try:
+        for event in stream_ollama_via_fastapi(query):
+            if event["type"] == "sources":
+                sources_placeholder.caption("Sources: " + ", ".join(str(source) for source in event["sources"]))
+            elif event["type"] == "token":
+                answer += event["text"]
+                answer_placeholder.markdown(answer + "▌")
+            elif event["type"] == "error":
+                st.error(f"Error from FastAPI: {event['message']}")
+    except Exception as e:
+        st.error(f"Error querying OLLAMA via FastAPI: {str(e)}")
+    answer_placeholder.markdown(answer)
+    return answer
+
+def submit_ingest_job(uploaded_file):
+    """Upload a file to the FastAPI backend for background ingestion and return the job id"""
     try:
         fastapi_url = st.session_state.get('fastapi_url', 'http://127.0.0.1:8000')
-        
-        payload = {
-            "requesttext": query
-        }
-        
         response = requests.post(
-            f"{fastapi_url}/submit_query",
-            json=payload,
+            f"{fastapi_url}/ingest",
+            files=[("files", (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type))],
+            data={"collection": st.session_state.get('collection') or ""},
             timeout=600
         )
-        print(response)
- 
         response.raise_for_status()
-        #return response.json().get('response', 'No response received')
-        return response
-
+        result = response.json()
+        if result["job_id"] is None:
+            st.info(f"{uploaded_file.name} was already uploaded, nothing to process")
+        return result["job_id"]
     except Exception as e:
-        return f"Error querying OLLAMA via FastAPI: {str(e)}"
+        st.error(f"Error submitting ingest job: {str(e)}")
+        return None
 
-def save_uploaded_file(uploaded_file):
-    """Save uploaded file to specified path and return file path"""
+def submit_web_job(urls):
+    """Queue a crawl of the URLs on the FastAPI backend and return the job id"""
     try:
-        # Create directory if it doesn't exist
-        save_path="data/source"
-        os.makedirs(save_path, exist_ok=True)
-        
-        # Generate unique filename to avoid conflicts
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = uploaded_file.name.split('.')[-1]
-        base_name = uploaded_file.name.rsplit('.', 1)[0]
-        unique_filename = f"{base_name}_{timestamp}.{file_extension}"
-        
-        file_path = os.path.join(save_path, unique_filename)
-        
-        # Save the file
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        return file_path, unique_filename
+        fastapi_url = st.session_state.get('fastapi_url', 'http://127.0.0.1:8000')
+        response = requests.post(
+            f"{fastapi_url}/ingest/web",
+            json={"urls": urls, "collection": st.session_state.get('collection') or None},
+            timeout=60
+        )
+        response.raise_for_status()
+        return response.json()["job_id"]
     except Exception as e:
-        st.error(f"Error saving file: {str(e)}")
-        return None, None
+        st.error(f"Error submitting web job: {str(e)}")
+        return None
+
+def wait_for_ingest_job(job_id, poll_seconds=1.0, unit="pages"):
+    """Poll the ingest job and show its progress until it finishes"""
+    fastapi_url = st.session_state.get('fastapi_url', 'http://127.0.0.1:8000')
+    progress_bar = st.progress(0.0)
+    status_placeholder = st.empty()
+    while True:
+        try:
+            response = requests.get(f"{fastapi_url}/ingest/{job_id}", timeout=30)
+            response.raise_for_status()
+            job = response.json()
+        except Exception as e:
+            st.error(f"Error reading ingest job status: {str(e)}")
+            return None
+
+        if job["total_pages"]:
+            progress_bar.progress(min(job["pages_done"] / job["total_pages"], 1.0))
+        eta = f", about {job['eta_seconds']:.0f}s left" if job["eta_seconds"] is not None else ""
+        status_placeholder.write(
+            f"{job['status']}: {job['pages_done']}/{job['total_pages']} {unit}, "
+            f"{job['embeddings_done']} chunks embedded{eta}"
+        )
+        if job["status"] == "done":
+            progress_bar.progress(1.0)
+            st.success("Document processed!")
+            return job
+        if job["status"] == "failed":
+            st.error(f"Ingestion failed: {job['error']}")
+            return job
+        time.sleep(poll_seconds)
 
 
 # Main Streamlit app
@@ -89,6 +145,13 @@ def main():
                 help="URL of your FastAPI backend"
             )
             st.session_state['fastapi_url'] = fastapi_url
+
+            # Corpus to query and upload into, the backend's default collection when left empty
+            st.session_state['collection'] = st.text_input(
+                "Collection",
+                value="",
+                help="Name of the document collection (tenant) to use"
+            ).strip()
             
             # Test FastAPI connection
             if st.button("Test FastAPI Connection"):
@@ -135,15 +198,14 @@ def main():
         
         submit_query = st.button("Submit Query", type="primary")
 
-        if submit_query and query:
+        if submit_query and query and model_config["provider"] == "ollama_fastapi":
+            # Tokens are rendered as they arrive, so no spinner for this provider.
+            render_streamed_answer(query)
+        elif submit_query and query:
             with st.spinner("Processing query..."):
                 
                 # Query the selected LLM
-                if model_config["provider"] == "ollama_fastapi":
-                    response = query_ollama_via_fastapi(
-                        query=query
-                    )
-                elif model_config["provider"] == "openai":
+                if model_config["provider"] == "openai":
                     if model_config.get("api_key"):
                         response = query_openai(model_config["api_key"], model_config["model"], full_prompt)
                     else:
@@ -196,8 +258,9 @@ def main():
                                 file_extension = uploaded_file.name.split('.')[-1].lower()
                                 
                                 if file_extension == 'pdf':
-                                    save_uploaded_file(uploaded_file)
-                                    maindocprocesser()
+                                    job_id = submit_ingest_job(uploaded_file)
+                                    if job_id:
+                                        wait_for_ingest_job(job_id)
                                 elif file_extension == 'docx':
                                     content = extract_text_from_docx(uploaded_file)
                                 elif file_extension == 'txt':
@@ -216,24 +279,24 @@ def main():
         
         col1, col2 = st.columns([3, 1])
         with col1:
-            web_url = st.text_input("Enter URL:", placeholder="https://example.com/article")
+            web_url = st.text_input("Enter URL(s):", placeholder="https://example.com/article https://example.com/faq")
         with col2:
             scrape_button = st.button("WebLoader", type="secondary")
         
         if scrape_button and web_url:
-            with st.spinner("Scraping web content..."):
-                content=[WebBaseLoader(url).load() for url in urls]
+            # Crawled by the backend's ingest worker, the only process that writes to the store.
+            # Several URLs are fetched concurrently, pages unchanged since the last crawl are skipped.
+            urls = web_url.replace(",", " ").split()
+            job_id = submit_web_job(urls)
+            job = wait_for_ingest_job(job_id, unit="URLs") if job_id else None
+            if job and job["results"] is not None:
+                results = job["results"]
+                changed = [result["url"] for result in results if result["status"] == "changed"]
+                failed = [f"{result['url']}: {result['error']}" for result in results if result["status"] == "failed"]
 
-                if content:
-                    docs_list = [item for sublist in content for item in sublist]
-                    mainwebprocess(docs_list)
-                    
-                    st.success(f"Web content saved!")
-                    
-                    # Show preview
-                    with st.expander("Preview Scraped Content"):
-                        preview = content[:1000] + "..." if len(content) > 1000 else content
-                        st.text_area("Content Preview:", preview, height=200)
+                st.success(f"Web content saved! {len(changed)} new or changed, {len(results) - len(changed) - len(failed)} unchanged")
+                for failure in failed:
+                    st.error(f"Could not fetch {failure}")
         elif scrape_button:
             st.error("Please enter a valid URL")
 
@@ -0,0 +1,148 @@
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from collection_paths import collection_path, resolve_collection
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity above which a different wording counts as the same question, 0 disables it.
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0"))
+# Rewritten by ingestion whenever the collection changes, read by the API before every lookup.
+# That of the default collection; the others have one in their own directory, see collection_paths.py.
+COLLECTION_VERSION_PATH = os.environ.get("COLLECTION_VERSION_PATH", "data/collection_version")
+
+
+def normalize_query(query_text):
+    return re.sub(r"\s+", " ", query_text).strip().strip("?!. ").lower()
+
+
+def get_collection_version_path(collection=None):
+    return collection_path(resolve_collection(collection), COLLECTION_VERSION_PATH, "collection_version")
+
+
+def read_collection_version(collection=None):
+    try:
+        with open(get_collection_version_path(collection), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_collection_version(collection=None):
+    version_path = get_collection_version_path(collection)
+    os.makedirs(os.path.dirname(version_path) or ".", exist_ok=True)
+    tmp_path = f"{version_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, version_path)
+
+
+class AnswerCache:
+    """LRU + TTL cache of answers, matched on normalized text or query embedding similarity"""
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, similarity=ANSWER_CACHE_SIMILARITY,
+                 collection=None):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # normalized query -> (created, response, unit embedding or None)
+        self._version = read_collection_version(collection)
+        self._lock = threading.Lock()
+
+    @property
+    def semantic(self):
+        return self.similarity > 0
+
+    def _check_version(self):
+        version = read_collection_version(self.collection)
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self.invalidations += 1
+
+    def _expire(self):
+        now = time.time()
+        for key in [key for key, (created, _, _) in self._entries.items() if now - created > self.ttl]:
+            del self._entries[key]
+
+    def _semantic_match(self, query_embedding):
+        candidates = [(key, embedding) for key, (_, _, embedding) in self._entries.items() if embedding is not None]
+        if not candidates:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = np.stack([embedding for _, embedding in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity:
+            return candidates[best][0]
+        return None
+
+    def peek(self, query_text):
+        """Exact-match lookup that only counts hits, for use before the query is embedded"""
+        key = normalize_query(query_text)
+        with self._lock:
+            self._check_version()
+            self._expire()
+            if key not in self._entries:
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][1]
+
+    def get(self, query_text, query_embedding=None):
+        key = normalize_query(query_text)
+        with self._lock:
+            self._check_version()
+            self._expire()
+
+            if key not in self._entries and self.semantic and query_embedding is not None:
+                match = self._semantic_match(query_embedding)
+                if match is not None:
+                    self.semantic_hits += 1
+                    key = match
+
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][1]
+
+    def put(self, query_text, response, query_embedding=None, version=None):
+        """Store an answer, unless the collection changed since `version` was read for it"""
+        embedding = None
+        if self.semantic and query_embedding is not None:
+            embedding = np.asarray(query_embedding, dtype=np.float32)
+            embedding /= np.linalg.norm(embedding) or 1.0
+
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                return
+            key = normalize_query(query_text)
+            self._entries[key] = (time.time(), response, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -1,11 +1,101 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import Headers
 from pydantic import BaseModel
 import uvicorn
-from rag_model import query_rag,QueryResponse
-app = FastAPI()
+import asyncio
+import json
+import time
+from ingest_jobs import get_ingest_queue
+from metrics import HTTP_REQUEST_SECONDS, render_metrics
+from profiling import PROFILE_ENABLED, PROFILE_HEADER, choose_mode, profile_path, request_id_from, start_profile, write_profile
+from upload_store import get_upload_paths, store_upload
+from collection_paths import resolve_collection
+from rag_model import aquery_rag,astream_query_rag,get_answer_cache,get_query_batcher,warm_up,QueryResponse
+from src.chromadb import UnknownCollectionError, get_chroma_db, get_collection_handles, get_startup_report
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    # Create the shared clients and load the models before accepting traffic.
+    await warm_up()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Endpoints that can be profiled, see profiling.py.
+PROFILED_PATHS = ("/submit_query", "/submit_query_stream", "/ingest", "/ingest/web")
+
+class ProfileMiddleware:
+    """Profiles sampled requests to PROFILED_PATHS until their body is sent, see profiling.py
+
+    Plain ASGI rather than @app.middleware, so every other request, streams included,
+    goes straight through without an extra task group and body stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in PROFILED_PATHS:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        request_id = request_id_from(headers.get("X-Request-ID"))
+        profile_mode = choose_mode(headers.get(PROFILE_HEADER))
+        # Read back as request.state by the ingest endpoints, which profile the job they queue.
+        scope.setdefault("state", {}).update(request_id=request_id, profile_mode=profile_mode)
+        if profile_mode is None:
+            return await self.app(scope, receive, send)
+
+        mode, profiler = start_profile(profile_mode)
+        path = profile_path(mode, request_id, scope["path"].strip("/"))
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # The mode only, the file path would expose the server's filesystem layout.
+                message["headers"] = [
+                    *message.get("headers", []), (b"x-request-id", request_id.encode()), (b"x-profile-mode", mode.encode())
+                ]
+            await send(message)
+
+        # Returns once the body is sent, streamed answers are generated while it goes out.
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            # cProfile must be disabled in the thread that enabled it, the file is written in a worker.
+            profiler.stop()
+            await asyncio.to_thread(write_profile, profiler, path)
+
+if PROFILE_ENABLED:
+    app.add_middleware(ProfileMiddleware)
+
+@app.middleware("http")
+async def time_requests(request:Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Streaming responses are timed to their first byte, rag_query_seconds covers the whole answer.
+    # The route template, not the raw path, so job IDs don't each get their own series.
+    route = request.scope.get("route")
+    path = route.path if route else "unmatched"
+    HTTP_REQUEST_SECONDS.labels(path, str(response.status_code)).observe(time.perf_counter() - start)
+    return response
 
 class SubmitRequest(BaseModel):
     requesttext:str
+    collection:str|None = None  # The default collection when not given.
+
+class WebIngestRequest(BaseModel):
+    urls:list[str]
+    collection:str|None = None
+
+async def open_collection(collection:str|None):
+    # Opened before answering, so a bad or unknown name is an HTTP error and not a failed stream.
+    try:
+        await asyncio.to_thread(get_chroma_db, collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnknownCollectionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
 @app.get("/")
@@ -17,11 +107,100 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "FastAPI OLLAMA backend is running"}
 
+@app.get("/answer_cache")
+async def answer_cache_stats(collection:str|None = None):
+    """Hit/miss counters of a collection's answer cache"""
+    await open_collection(collection)
+    return get_answer_cache(collection).stats()
+
+@app.get("/collections")
+async def collections_stats():
+    """Open collections, most recently used first, with the memory their indexes hold, and eviction counters"""
+    return get_collection_handles().stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics: stage latency histograms, token counters and ingestion progress"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/startup")
+async def startup_report():
+    """Time spent in each start-up phase: store copy, imports, opening the store, model warm-up"""
+    return get_startup_report()
+
+@app.get("/query_batcher")
+async def query_batcher_stats():
+    """Batch counters of the query embedding coalescer"""
+    return get_query_batcher().stats()
+
 @app.post("/submit_query")
-def submit_query_endpoint(request:SubmitRequest) -> QueryResponse:
-    query_response= query_rag(request.requesttext)
+async def submit_query_endpoint(request:SubmitRequest) -> QueryResponse:
+    await open_collection(request.collection)
+    query_response= await aquery_rag(request.requesttext, request.collection)
     return query_response
 
+@app.post("/submit_query_stream")
+async def submit_query_stream_endpoint(request:SubmitRequest):
+    """Stream the answer as JSON lines: sources first, then tokens, then done"""
+    await open_collection(request.collection)
+    async def event_lines():
+        try:
+            async for event in astream_query_rag(request.requesttext, request.collection):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band.
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+@app.post("/ingest")
+def ingest_endpoint(request:Request, files:list[UploadFile], collection:str|None = Form(None)):
+    """Save the uploaded files and queue an ingestion job into the collection, returns its id"""
+    # A new collection is created by its first ingestion.
+    try:
+        save_path, index_path, manifest_path = get_upload_paths(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stored = [store_upload(file.file, file.filename, save_path, index_path, manifest_path) for file in files]
+    duplicates = [upload.filename for upload in stored if upload.duplicate]
+    new_paths = [upload.path for upload in stored if not upload.duplicate]
+    if not new_paths:
+        # Every file is already stored under its content hash, nothing to ingest.
+        return {"job_id": None, "duplicates": duplicates}
+    # A profiled upload also profiles its ingestion run, under the same request ID.
+    job = get_ingest_queue().submit(
+        new_paths,
+        collection=collection,
+        profile_mode=getattr(request.state, "profile_mode", None),
+        request_id=getattr(request.state, "request_id", None),
+    )
+    return {"job_id": job.job_id, "duplicates": duplicates}
+
+@app.post("/ingest/web")
+def ingest_web_endpoint(request:Request, body:WebIngestRequest):
+    """Queue a crawl of the URLs into the collection, returns the job id"""
+    try:
+        resolve_collection(body.collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The ingest worker is the only writer to the store, crawls wait their turn behind uploads.
+    job = get_ingest_queue().submit_web(
+        body.urls,
+        collection=body.collection,
+        profile_mode=getattr(request.state, "profile_mode", None),
+        request_id=getattr(request.state, "request_id", None),
+    )
+    return {"job_id": job.job_id}
+
+@app.get("/ingest/{job_id}")
+def ingest_status_endpoint(job_id:str):
+    """Progress of an ingestion job: pages, chunks and embeddings done, and an ETA"""
+    job = get_ingest_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job {job_id}")
+    return job.to_dict()
+
 
 if __name__ == "__main__":
     #
@@ -0,0 +1,256 @@
+"""Stage-level throughput and latency of ingestion and retrieval, fully offline.
+
+A synthetic PDF corpus is generated, then load_documents, split_documents,
+calculate_chunk_ids and add_to_chroma are timed one after the other, followed
+by retrieve and query_rag. Ollama is replaced by the deterministic stand-in in
+fake_ollama.py, so the numbers measure this code and not a model server.
+Results go to a JSON file. With --compare the run fails when a stage is slower
+than the baseline by more than --tolerance.
+
+    python benchmarks/bench_pipeline.py --docs 20 --pages 10 --queries 100 --output bench.json
+    python benchmarks/bench_pipeline.py --compare bench.json
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Appended, not prepended: the repo's own chromadb.py must not shadow the chromadb package.
+sys.path.append(REPO_ROOT)
+
+from bench_vector_backends import percentiles  # noqa: E402
+from fake_ollama import FakeOllamaServer  # noqa: E402
+
+LINES_PER_PAGE = 45
+WORDS_PER_LINE = 14
+
+
+def make_vocabulary(rng, size=3000):
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zo", "pe", "da", "gu", "shi", "ter", "mon", "bal"]
+    return sorted({"".join(rng.choice(syllables, size=rng.integers(2, 4))) for _ in range(size)})
+
+
+def write_pdf(path, pages):
+    """Write a plain-text PDF, one list of lines per page, that pypdf can extract"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for lines in pages:
+        text = " Tj T* ".join("(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(rng, source_dir, docs, pages):
+    """Generate docs PDFs and return (paths, queries source) where each document leans on its own topic words"""
+    vocabulary = make_vocabulary(rng)
+    os.makedirs(source_dir, exist_ok=True)
+    paths, sentences = [], []
+    for doc in range(docs):
+        topic = rng.choice(vocabulary, size=40, replace=False)
+        doc_pages = []
+        for _ in range(pages):
+            lines = []
+            for _ in range(LINES_PER_PAGE):
+                # Half topic words, half general vocabulary.
+                words = np.where(rng.random(WORDS_PER_LINE) < 0.5,
+                                 rng.choice(topic, size=WORDS_PER_LINE), rng.choice(vocabulary, size=WORDS_PER_LINE))
+                lines.append(" ".join(words) + ".")
+            doc_pages.append(lines)
+            sentences.append(lines[rng.integers(0, LINES_PER_PAGE)])
+        path = os.path.join(source_dir, f"doc_{doc:04d}.pdf")
+        write_pdf(path, doc_pages)
+        paths.append(path)
+    return paths, sentences
+
+
+def make_queries(rng, sentences, count):
+    queries = []
+    for _ in range(count):
+        words = sentences[rng.integers(0, len(sentences))].rstrip(".").split()
+        start = rng.integers(0, max(len(words) - 5, 1))
+        queries.append(f"What does the document say about {' '.join(words[start:start + 5])}?")
+    return queries
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; the loader's worker processes count as children.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return round(own, 1), round(children, 1)
+
+
+def timed(name, unit, func, *args):
+    """Run one stage with its prints silenced and return (result, stats)"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+    items = len(result) if unit else None
+    stats = {"seconds": round(seconds, 4)}
+    if unit:
+        stats.update({unit: items, f"{unit}_per_s": round(items / max(seconds, 1e-9), 2)})
+    stats["peak_rss_mb"], stats["peak_child_rss_mb"] = peak_rss_mb()
+    print(f"{name:>18}: {stats}")
+    return result, stats
+
+
+def timed_queries(name, func, queries):
+    latencies = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            latencies.append(time.perf_counter() - start)
+    stats = {"queries": len(queries), "queries_per_s": round(len(queries) / max(sum(latencies), 1e-9), 2),
+             **percentiles(latencies)}
+    stats["peak_rss_mb"], stats["peak_child_rss_mb"] = peak_rss_mb()
+    print(f"{name:>18}: {stats}")
+    return stats
+
+
+def import_query_side():
+    # rag_model imports its siblings as src.*, the package name it is deployed under.
+    if "src" not in sys.modules:
+        package = types.ModuleType("src")
+        package.__path__ = [REPO_ROOT]
+        sys.modules["src"] = package
+    return importlib.import_module("src.rag_model")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of every stage metric against baseline and return the regressions"""
+    regressions = []
+    for stage, stats in results["stages"].items():
+        for metric, value in stats.items():
+            before = baseline.get("stages", {}).get(stage, {}).get(metric)
+            if not before or not isinstance(value, (int, float)):
+                continue
+            # Throughput should not drop, latency should not grow.
+            if metric.endswith("_per_s"):
+                worse = value < before * (1 - tolerance)
+            elif metric.endswith("_ms") or metric == "seconds":
+                worse = value > before * (1 + tolerance)
+            else:
+                continue
+            change = (value - before) / before * 100
+            print(f"{stage:>18} {metric:>20}: {before} -> {value} ({change:+.1f}%){'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append((stage, metric, before, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document.")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=0, help="PDF parsing processes, 0 parses in this process.")
+    parser.add_argument("--backend", default=os.environ.get("VECTOR_BACKEND", "chroma"), choices=("chroma", "flat"))
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-item-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--skip-query", action="store_true", help="Only benchmark ingestion.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before a stage counts as regressed.")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        # Read before running, --output may point at the same file.
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    server = FakeOllamaServer(embed_latency_ms=args.embed_latency_ms, embed_item_latency_ms=args.embed_item_latency_ms,
+                              token_latency_ms=args.token_latency_ms).start()
+    cwd = os.getcwd()
+    try:
+        # Every data/ path in the repo is relative, so a fresh working directory is a fresh store.
+        os.chdir(workdir)
+        os.environ["OLLAMA_HOST"] = server.url
+        os.environ["VECTOR_BACKEND"] = args.backend
+        paths, sentences = make_corpus(rng, "data/source", args.docs, args.pages)
+        queries = make_queries(rng, sentences, args.queries)
+        create_db = importlib.import_module("create_db")
+
+        stages = {}
+        pages, stages["load_documents"] = timed("load_documents", "pages", create_db.load_documents, paths, args.workers)
+        chunks, stages["split_documents"] = timed("split_documents", "chunks", create_db.split_documents, pages)
+        _, stages["calculate_chunk_ids"] = timed("calculate_chunk_ids", "chunks", create_db.calculate_chunk_ids, chunks)
+
+        def add(chunks):
+            create_db.add_to_chroma(chunks)
+            return chunks
+        _, stages["add_to_chroma"] = timed("add_to_chroma", "embeddings", add, chunks)
+
+        if not args.skip_query:
+            rag_model = import_query_side()
+            db = rag_model.get_chroma_db()
+            stages["retrieve"] = timed_queries("retrieve", lambda query: rag_model.retrieve(db, query), queries)
+            stages["query_rag"] = timed_queries("query_rag", rag_model.query_rag, queries)
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "tolerance")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "commit": git_commit()},
+        "ollama_requests": server.requests,
+        "stages": stages,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline:
+        if baseline.get("config") != results["config"]:
+            print("⚠️ Baseline was run with a different configuration, the comparison may not mean much")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
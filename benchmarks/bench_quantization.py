@@ -0,0 +1,69 @@
+"""Recall@k, memory and latency of each flat index quantization.
+
+Every quantization is searched over the same synthetic, clustered unit vectors.
+Recall@k is measured against exact float32 search, with rescoring of
+k * RESCORE_MULTIPLIER candidates.
+
+    python benchmarks/bench_quantization.py --chunks 100000 --dim 1024 --rescore 10
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Appended, not prepended: the repo's own chromadb.py must not shadow the chromadb package.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_vector_backends import make_queries, make_vectors, percentiles, recall  # noqa: E402
+from flat_index import FlatVectorStore  # noqa: E402
+from quantization import QUANTIZATIONS  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rescore", type=int, default=10, help="Candidates rescored, as a multiple of k.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = make_vectors(rng, args.chunks, args.dim)
+    queries = make_queries(rng, vectors, args.queries)
+    ids = [f"chunk-{i}" for i in range(args.chunks)]
+    truth = [[ids[row] for row in np.argsort(-(vectors @ query))[:args.k]] for query in queries]
+
+    workdir = tempfile.mkdtemp(prefix="bench_quantization_")
+    try:
+        # Build once in float32, each quantization then encodes its codes from the same matrix.
+        path = os.path.join(workdir, "flat")
+        store = FlatVectorStore(path, quantization="float32")
+        store.upsert_embeddings(ids, vectors, [""] * len(ids), [{}] * len(ids))
+        store.save()
+
+        print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}, rescore x{args.rescore}")
+        for kind in QUANTIZATIONS:
+            store = FlatVectorStore(path, read_only=True, quantization=kind, rescore_multiplier=args.rescore)
+            found, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                rows = store.search_by_vector(query, args.k)
+                latencies.append(time.perf_counter() - start)
+                found.append([store.ids[row] for row, _ in rows])
+            memory_mb = store.memory_bytes() / 1024**2
+            print(
+                f"{kind:>8}: recall@{args.k}={recall(found, truth):.4f} "
+                f"memory={memory_mb:.1f}MB ({store.memory_bytes() / len(ids):.0f} B/chunk) {percentiles(latencies)}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Compare recall and latency of the flat NumPy index against Chroma.
+
+Both backends are loaded with the same synthetic, clustered unit vectors.
+Recall@k is measured against exact brute-force search.
+
+    python benchmarks/bench_vector_backends.py --chunks 100000 --dim 1024
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Appended, not prepended: the repo's own chromadb.py must not shadow the chromadb package.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb  # noqa: E402
+from flat_index import FlatVectorStore  # noqa: E402
+
+
+def make_vectors(rng, count, dim, clusters=256):
+    # Clustered data is closer to real embeddings than uniform noise, and harder for ANN indexes.
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(rng, vectors, count):
+    # Queries land near stored chunks, the way real questions land near their answers.
+    queries = vectors[rng.integers(0, len(vectors), size=count)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(samples, p)), 3) for p in (50, 95, 99)}
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def bench_flat(path, ids, vectors, queries, k, batch_size):
+    store = FlatVectorStore(path)
+    start = time.perf_counter()
+    for begin in range(0, len(ids), batch_size):
+        end = begin + batch_size
+        store.upsert_embeddings(ids[begin:end], vectors[begin:end], [""] * len(ids[begin:end]), [{}] * len(ids[begin:end]))
+    store.save()
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = FlatVectorStore(path, read_only=True)
+    open_s = time.perf_counter() - start
+
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows = store.search_by_vector(query, k)
+        latencies.append(time.perf_counter() - start)
+        found.append([store.ids[row] for row, _ in rows])
+    return found, {"build_s": round(build_s, 3), "open_s": round(open_s, 4), **percentiles(latencies)}
+
+
+def bench_chroma(path, ids, vectors, queries, k, batch_size):
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    start = time.perf_counter()
+    batch_size = min(batch_size, client.get_max_batch_size())
+    for begin in range(0, len(ids), batch_size):
+        end = begin + batch_size
+        collection.upsert(ids=ids[begin:end], embeddings=vectors[begin:end])
+    build_s = time.perf_counter() - start
+    del collection, client
+
+    start = time.perf_counter()
+    collection = chromadb.PersistentClient(path=path).get_collection("bench")
+    open_s = time.perf_counter() - start
+
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        found.append(result["ids"][0])
+    return found, {"build_s": round(build_s, 3), "open_s": round(open_s, 4), **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = make_vectors(rng, args.chunks, args.dim)
+    queries = make_queries(rng, vectors, args.queries)
+    ids = [f"chunk-{i}" for i in range(args.chunks)]
+
+    # Ground truth from exact search over the full matrix.
+    truth = [[ids[row] for row in np.argsort(-(vectors @ query))[:args.k]] for query in queries]
+
+    workdir = tempfile.mkdtemp(prefix="bench_vector_backends_")
+    try:
+        print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}")
+        for name, bench in (("flat", bench_flat), ("chroma", bench_chroma)):
+            found, stats = bench(os.path.join(workdir, name), ids, vectors, queries, args.k, args.batch_size)
+            print(f"{name:>6}: recall@{args.k}={recall(found, truth):.4f} {stats}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Deterministic stand-in for the Ollama HTTP API, so benchmarks run offline.
+
+Embeddings are hashed bags of words, so texts sharing words land close together
+and retrieval still means something. Chat answers are built from the question
+words and streamed token by token. Latencies are configurable to mimic a real
+model server.
+
+    python benchmarks/fake_ollama.py --port 11434 --embed-latency-ms 2 --token-latency-ms 5
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+EMBED_DIM = 1024
+
+
+def embed_text(text, dim=EMBED_DIM):
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        value = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        vector[value % dim] += 1.0 if (value >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0], norm = 1.0, 1.0
+    return (vector / norm).tolist()
+
+
+def answer_tokens(question, count):
+    words = re.findall(r"\w+", question) or ["answer"]
+    return [f"{words[i % len(words)]} " for i in range(count)]
+
+
+class FakeOllamaServer:
+    def __init__(self, host="127.0.0.1", port=0, dim=EMBED_DIM, embed_latency_ms=0.0,
+                 embed_item_latency_ms=0.0, first_token_latency_ms=0.0, token_latency_ms=0.0, answer_length=32,
+                 chat_parallel=0):
+        self.dim = dim
+        self.embed_latency = embed_latency_ms / 1000
+        self.embed_item_latency = embed_item_latency_ms / 1000
+        self.first_token_latency = first_token_latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self.answer_length = answer_length
+        # Like OLLAMA_NUM_PARALLEL: answers generated at once, the rest queue. 0 means unlimited.
+        self.chat_slots = threading.BoundedSemaphore(chat_parallel) if chat_parallel > 0 else None
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _handler_for(server):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real server, so clients reuse their connections.
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle on, delayed ACKs would add ~40ms
+        # to every kept-alive request and swamp the latencies this server is meant to leave out.
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_chunk(self, payload):
+            line = json.dumps(payload).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            server.count(self.path)
+            if self.path == "/api/version":
+                self._send_json({"version": "0.0.0-fake"})
+            elif self.path == "/api/tags":
+                self._send_json({"models": []})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            server.count(self.path)
+            request = self._read_json()
+            if self.path == "/api/embed":
+                inputs = request.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                time.sleep(server.embed_latency + server.embed_item_latency * len(inputs))
+                self._send_json({"model": request.get("model"), "embeddings": [embed_text(text, server.dim) for text in inputs]})
+            elif self.path == "/api/embeddings":
+                time.sleep(server.embed_latency + server.embed_item_latency)
+                self._send_json({"embedding": embed_text(request.get("prompt", ""), server.dim)})
+            elif self.path in ("/api/chat", "/api/generate"):
+                if server.chat_slots is None:
+                    self._chat(request)
+                else:
+                    with server.chat_slots:
+                        self._chat(request)
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def _chat(self, request):
+            chat = self.path == "/api/chat"
+            if chat:
+                question = " ".join(message.get("content", "") for message in request.get("messages", []))
+            else:
+                question = request.get("prompt", "")
+            # Only the tail of the prompt, the context would dominate the answer words otherwise.
+            tokens = answer_tokens(question[-200:], server.answer_length)
+
+            def event(text, done):
+                payload = {"model": request.get("model"), "created_at": _now(), "done": done}
+                if chat:
+                    payload["message"] = {"role": "assistant", "content": text}
+                else:
+                    payload["response"] = text
+                if done:
+                    payload.update(done_reason="stop", prompt_eval_count=len(question) // 4, eval_count=len(tokens))
+                return payload
+
+            time.sleep(server.first_token_latency)
+            if not request.get("stream", True):
+                time.sleep(server.token_latency * len(tokens))
+                self._send_json(event("".join(tokens), True))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(server.token_latency)
+                self._send_chunk(event(token, False))
+            self._send_chunk(event("", True))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=EMBED_DIM)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Fixed cost of one embed request.")
+    parser.add_argument("--embed-item-latency-ms", type=float, default=0.0, help="Extra cost per embedded text.")
+    parser.add_argument("--first-token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--answer-length", type=int, default=32, help="Tokens per chat answer.")
+    parser.add_argument("--chat-parallel", type=int, default=0, help="Answers generated at once, 0 for no limit.")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        args.host, args.port, args.dim, args.embed_latency_ms, args.embed_item_latency_ms,
+        args.first_token_latency_ms, args.token_latency_ms, args.answer_length, args.chat_parallel,
+    )
+    print(f"Fake Ollama listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
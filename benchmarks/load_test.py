@@ -0,0 +1,297 @@
+"""Load test of the FastAPI /submit_query endpoint.
+
+By default the whole service runs locally: fake_ollama.py in its own process
+with tunable latency, token rate and generation slots, a store built from a
+synthetic corpus, and api_handler under uvicorn with --uvicorn-workers
+processes. --url points the load at a service that is already running instead.
+
+Two sweeps are run:
+  * closed loop, a fixed number of clients each sending the next request as
+    soon as the previous one returns (--concurrency);
+  * open loop, requests sent at a fixed rate whether or not earlier ones came
+    back (--qps). Latency is counted from the scheduled send time, so queueing
+    in front of a saturated service shows up in the numbers.
+
+Every step reports throughput, error rate and latency percentiles. The summary
+gives the highest throughput reached and the first step that broke the SLO.
+
+    python benchmarks/load_test.py --concurrency 1,4,16 --qps 2,5,10,20 --duration 20 \\
+        --uvicorn-workers 2 --token-latency-ms 20 --chat-parallel 4 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Appended, not prepended: the repo's own chromadb.py must not shadow the chromadb package.
+sys.path.append(REPO_ROOT)
+
+from bench_pipeline import make_corpus, make_queries  # noqa: E402
+
+# Imported by every uvicorn worker; rag_model imports its siblings as src.*.
+APP_BOOTSTRAP = f"""import sys
+import types
+sys.path.append({REPO_ROOT!r})
+package = types.ModuleType("src")
+package.__path__ = [{REPO_ROOT!r}]
+sys.modules["src"] = package
+from api_handler import app
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before it was ready")
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def start_fake_ollama(args):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS_DIR, "fake_ollama.py"), "--port", str(port),
+        "--embed-latency-ms", str(args.embed_latency_ms),
+        "--embed-item-latency-ms", str(args.embed_item_latency_ms),
+        "--first-token-latency-ms", str(args.first_token_latency_ms),
+        "--token-latency-ms", str(args.token_latency_ms),
+        "--answer-length", str(args.answer_length),
+        "--chat-parallel", str(args.chat_parallel),
+    ], stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/api/version", process)
+    return process, url
+
+
+def build_store(workdir, env, args, rng):
+    """Generate the corpus and ingest it in a child process, as create_db.py would"""
+    _, sentences = make_corpus(rng, os.path.join(workdir, "data", "source"), args.docs, args.pages)
+    subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.append({REPO_ROOT!r}); import create_db; create_db.update_chroma()"],
+        cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    return sentences
+
+
+def start_service(workdir, env, args):
+    with open(os.path.join(workdir, "load_test_app.py"), "w", encoding="utf-8") as f:
+        f.write(APP_BOOTSTRAP)
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "load_test_app:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.uvicorn_workers), "--log-level", "warning",
+    ], cwd=workdir, env=env)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/health", process)
+    return process, url
+
+
+class QuerySource:
+    """Hands out queries; every one is unique unless --query-pool is set, so the answer cache stays cold"""
+
+    def __init__(self, queries, pool):
+        self.queries = queries[:pool] if pool else queries
+        self.unique = not pool
+        self.sent = 0
+
+    def next(self):
+        query = self.queries[self.sent % len(self.queries)]
+        if self.unique:
+            query = f"{query} (request {self.sent})"
+        self.sent += 1
+        return query
+
+
+async def send(client, url, query, scheduled):
+    try:
+        response = await client.post(f"{url}/submit_query", json={"requesttext": query})
+        error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+    except httpx.HTTPError as e:
+        error = type(e).__name__
+    return time.perf_counter() - scheduled, error
+
+
+async def closed_loop(client, url, source, concurrency, duration):
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            samples.append(await send(client, url, source.next(), time.perf_counter()))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+async def open_loop(client, url, source, qps, duration, rng, max_in_flight):
+    samples, tasks, dropped = [], [], 0
+    start = time.perf_counter()
+    scheduled = start
+    while scheduled < start + duration:
+        # Poisson arrivals, the way independent users hit a service.
+        scheduled += rng.exponential(1 / qps)
+        await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+        tasks = [task for task in tasks if not task.done()]
+        if len(tasks) >= max_in_flight:
+            # The client gave up on this one: counts as an error, not as a fast response.
+            dropped += 1
+            samples.append((time.perf_counter() - scheduled, "dropped"))
+            continue
+        task = asyncio.create_task(send(client, url, source.next(), scheduled))
+        task.add_done_callback(lambda done: samples.append(done.result()))
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed, **step):
+    latencies = np.array([latency for latency, error in samples if error is None]) * 1000
+    errors = {}
+    for _, error in samples:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    summary = {
+        **step,
+        "requests": len(samples),
+        "ok": len(latencies),
+        "error_rate": round(sum(errors.values()) / max(len(samples), 1), 4),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+    }
+    if len(latencies):
+        summary.update({f"p{p}_ms": round(float(np.percentile(latencies, p)), 1) for p in (50, 90, 95, 99)})
+        summary["max_ms"] = round(float(latencies.max()), 1)
+    print(f"  {summary}")
+    return summary
+
+
+def saturation(steps, slo_ms, max_error_rate):
+    """Best throughput reached and the first step that broke the latency SLO or the error budget"""
+    if not steps:
+        return {}
+    best = max(steps, key=lambda step: step["throughput_rps"])
+    failing = next(
+        (step for step in steps if step["error_rate"] > max_error_rate or step.get("p99_ms", float("inf")) > slo_ms),
+        None,
+    )
+    keys = ("concurrency", "qps")
+    return {
+        "max_throughput_rps": best["throughput_rps"],
+        "max_throughput_at": {key: best[key] for key in keys if key in best},
+        "first_failing_step": {key: failing[key] for key in keys if key in failing} if failing else None,
+    }
+
+
+async def run_sweeps(url, args, queries, rng):
+    source = QuerySource(queries, args.query_pool)
+    concurrency = [int(value) for value in args.concurrency.split(",") if value]
+    qps = [float(value) for value in args.qps.split(",") if value]
+    limits = httpx.Limits(max_connections=max(concurrency + [args.max_in_flight]))
+    results = {"closed_loop": [], "open_loop": []}
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(args.timeout, pool=None)) as client:
+        if args.warmup:
+            # Loads the models and opens the store before anything is measured.
+            await closed_loop(client, url, source, 1, args.warmup)
+        for clients in concurrency:
+            print(f"closed loop, {clients} concurrent clients")
+            samples, elapsed = await closed_loop(client, url, source, clients, args.duration)
+            results["closed_loop"].append(summarize(samples, elapsed, concurrency=clients))
+        for rate in qps:
+            print(f"open loop, {rate} requests/s offered")
+            samples, elapsed = await open_loop(client, url, source, rate, args.duration, rng, args.max_in_flight)
+            results["open_loop"].append(summarize(samples, elapsed, qps=rate))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Running service to test; without it a local one is started.")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Closed loop steps, comma separated.")
+    parser.add_argument("--qps", default="1,2,4,8,16", help="Open loop steps in requests/s, comma separated.")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per step.")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of unmeasured traffic first.")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open loop requests outstanding before new ones are dropped.")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--query-pool", type=int, default=0, help="Repeat this many distinct queries, 0 makes every query unique.")
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p99 latency a step must stay under.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test.json")
+    local = parser.add_argument_group("local service")
+    local.add_argument("--uvicorn-workers", type=int, default=1)
+    local.add_argument("--backend", default=os.environ.get("VECTOR_BACKEND", "chroma"), choices=("chroma", "flat"))
+    local.add_argument("--docs", type=int, default=20)
+    local.add_argument("--pages", type=int, default=10)
+    local.add_argument("--embed-latency-ms", type=float, default=5)
+    local.add_argument("--embed-item-latency-ms", type=float, default=1)
+    local.add_argument("--first-token-latency-ms", type=float, default=100)
+    local.add_argument("--token-latency-ms", type=float, default=20, help="1000 / tokens per second of one generation.")
+    local.add_argument("--answer-length", type=int, default=64)
+    local.add_argument("--chat-parallel", type=int, default=4, help="Generations the mock LLM runs at once, like OLLAMA_NUM_PARALLEL.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+            _, sentences = make_corpus(rng, os.path.join(workdir, "source"), 2, 5)
+        else:
+            ollama, ollama_url = start_fake_ollama(args)
+            processes.append(ollama)
+            env = {**os.environ, "OLLAMA_HOST": ollama_url, "VECTOR_BACKEND": args.backend}
+            print(f"Building a {args.docs} x {args.pages} page store in {workdir}")
+            sentences = build_store(workdir, env, args, rng)
+            service, url = start_service(workdir, env, args)
+            processes.append(service)
+            print(f"Service on {url} with {args.uvicorn_workers} worker(s), mock LLM on {ollama_url}")
+
+        queries = make_queries(rng, sentences, 1000)
+        results = asyncio.run(run_sweeps(url, args, queries, rng))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results["saturation"] = {
+        name: saturation(steps, args.slo_ms, args.max_error_rate) for name, steps in results.items()
+    }
+    results["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+    output = os.path.abspath(args.output)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["saturation"], indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,224 @@
-from langchain_community.vectorstores import Chroma
-from src.embeddings import get_embedding_function
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import shutil
 import sys
 import os
+import threading
+import time
+
+from src.collection_handles import CollectionHandles
+from src.collection_paths import DEFAULT_COLLECTION, resolve_collection, store_file_name
 
 CHROMA_PATH = os.environ.get("CHROMA_PATH", "data/chroma")
 IS_USING_IMAGE_RUNTIME = bool(os.environ.get("IS_USING_IMAGE_RUNTIME", False))
-CHROMA_DB_INSTANCE = None  # Reference to singleton instance of ChromaDB
+# "chroma" or "flat" (in-process NumPy index, see flat_index.py).
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+# Serve from single-file snapshots written by snapshot.py instead of the store directory.
+# "{collection}" in the path is replaced by the collection name; without it only the default collection is served.
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH")
+# How the image runtime gets a usable store:
+#   "copy"       copy the whole store to /tmp before opening it;
+#   "background" start that copy at import, so it overlaps the rest of start-up;
+#   "in_place"   open it where it is, read-only, without copying (flat backend only,
+#                Chroma's SQLite needs a writable directory);
+#   "auto"       in_place for the flat backend, background for Chroma.
+COLD_START_MODE = os.environ.get("COLD_START_MODE", "auto")
+# Files copied at once, and the size above which one file is copied in parallel ranges.
+COPY_WORKERS = int(os.environ.get("COPY_WORKERS", "8"))
+COPY_SPLIT_BYTES = 64 * 1024 * 1024
+COPY_COMPLETE_MARKER = ".copy_complete"
+# Hot collections opened by the warm-up, before the first request; comma separated.
+PREWARM_COLLECTIONS = [name.strip() for name in os.environ.get("PREWARM_COLLECTIONS", "").split(",") if name.strip()]
+COLLECTION_HANDLES_INSTANCE = None  # Reference to singleton instance of CollectionHandles
+CHROMA_CLIENT_INSTANCE = None  # Reference to singleton instance of the Chroma client
+COPY_FUTURE = None  # Background copy started by start_copy_chroma_to_tmp
+STARTUP_TIMINGS = {}  # Seconds per start-up phase, see get_startup_report
+_STARTUP_LOCK = threading.Lock()
+_MODULE_LOADED_AT = time.perf_counter()
+
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _STARTUP_LOCK:
+            STARTUP_TIMINGS[name] = round(time.perf_counter() - start, 4)
+
+
+def get_startup_report():
+    """Start-up phases with their durations, plus the time from loading this module to now"""
+    with _STARTUP_LOCK:
+        return {
+            "cold_start_mode": get_cold_start_mode(),
+            "phases": dict(STARTUP_TIMINGS),
+            "since_module_load_s": round(time.perf_counter() - _MODULE_LOADED_AT, 4),
+        }
+
+
+def get_cold_start_mode():
+    # A snapshot is memory-mapped read-only where it lies, it never needs a copy.
+    if not IS_USING_IMAGE_RUNTIME or SNAPSHOT_PATH:
+        return "in_place"
+    if COLD_START_MODE == "auto":
+        return "in_place" if VECTOR_BACKEND == "flat" else "background"
+    return COLD_START_MODE
+
 
+class UnknownCollectionError(LookupError):
+    pass
 
-def get_chroma_db():
-    global CHROMA_DB_INSTANCE
-    if not CHROMA_DB_INSTANCE:
 
+def get_collection_handles():
+    global COLLECTION_HANDLES_INSTANCE
+    if COLLECTION_HANDLES_INSTANCE is None:
+        COLLECTION_HANDLES_INSTANCE = CollectionHandles()
+    return COLLECTION_HANDLES_INSTANCE
+
+
+def get_snapshot_path(collection):
+    if "{collection}" in SNAPSHOT_PATH:
+        return SNAPSHOT_PATH.format(collection=collection)
+    if collection != DEFAULT_COLLECTION:
+        raise UnknownCollectionError(f"SNAPSHOT_PATH only serves the collection {DEFAULT_COLLECTION}")
+    return SNAPSHOT_PATH
+
+
+def get_chroma_client():
+    """One Chroma client for every collection in the store"""
+    global CHROMA_CLIENT_INSTANCE
+    if CHROMA_CLIENT_INSTANCE is None:
         # Hack needed for AWS Lambda's base Python image (to work with an updated version of SQLite).
         # In Lambda runtime, we need to copy ChromaDB to /tmp so it can have write permissions.
         if IS_USING_IMAGE_RUNTIME:
             __import__("pysqlite3")
             sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
-            copy_chroma_to_tmp()
+        import chromadb
 
-        # Prepare the DB.
-        CHROMA_DB_INSTANCE = Chroma(
-            persist_directory=get_runtime_chroma_path(),
-            embedding_function=get_embedding_function(),
-        )
-        print(f"✅ Init ChromaDB {CHROMA_DB_INSTANCE} from {get_runtime_chroma_path()}")
+        # Default settings, like ingestion's client: Chroma shares one client per path only when they match.
+        CHROMA_CLIENT_INSTANCE = chromadb.PersistentClient(path=get_runtime_chroma_path())
+    return CHROMA_CLIENT_INSTANCE
 
-    return CHROMA_DB_INSTANCE
+
+def open_store(collection):
+    """Open one collection, read-only where the backend allows it"""
+    if get_cold_start_mode() != "in_place":
+        with startup_phase("copy_wait"):
+            start_copy_chroma_to_tmp().result()
+
+    # The heavy clients are imported on first use, not when this module loads.
+    with startup_phase("import_embeddings"):
+        from src.embeddings import EMBEDDING_CLIENT_VERSION, EMBEDDING_MODEL, get_query_embedding_function
+    # Serving handles only embed queries, so not through the document cache: that would open its
+    # SQLite file on every collection open, and the image runtime's filesystem is read-only.
+
+    # Prepare the DB.
+    if SNAPSHOT_PATH:
+        with startup_phase("import_store"):
+            from src.snapshot import SnapshotStore
+        path = get_snapshot_path(collection)
+        if not os.path.exists(path):
+            raise UnknownCollectionError(f"No snapshot for collection {collection} at {path}")
+        with startup_phase(f"open_store:{collection}"):
+            # Vectors of another embedding model or client would rank chunks by noise, so refuse to serve them.
+            db = SnapshotStore(
+                path, embedding_function=get_query_embedding_function(), embedding_model=EMBEDDING_MODEL,
+                embedding_client_version=EMBEDDING_CLIENT_VERSION,
+            )
+    elif VECTOR_BACKEND == "flat":
+        with startup_phase("import_store"):
+            from src.flat_index import FLAT_INDEX_DIRNAME, FlatVectorStore
+        path = os.path.join(get_runtime_chroma_path(), store_file_name(FLAT_INDEX_DIRNAME, collection))
+        if not os.path.isdir(path):
+            raise UnknownCollectionError(f"No flat index for collection {collection} at {path}")
+        with startup_phase(f"open_store:{collection}"):
+            db = FlatVectorStore(path, embedding_function=get_query_embedding_function(), read_only=True)
+    else:
+        with startup_phase("import_store"):
+            from langchain_community.vectorstores import Chroma
+        path = get_runtime_chroma_path()
+        with startup_phase(f"open_store:{collection}"):
+            client = get_chroma_client()
+            # Older clients list Collection objects, newer ones just names.
+            if collection not in {getattr(found, "name", found) for found in client.list_collections()}:
+                raise UnknownCollectionError(f"No Chroma collection {collection} in {path}")
+            db = Chroma(client=client, collection_name=collection, embedding_function=get_query_embedding_function())
+    print(f"✅ Init {type(db).__name__} for collection {collection} from {path}")
+    print(f"Start-up: {get_startup_report()}")
+    return db
+
+
+def get_chroma_db(collection=None):
+    """The store of a collection, opened on first use and kept in the LRU of open collections"""
+    collection = resolve_collection(collection)
+    return get_collection_handles().get(collection, "db", lambda: open_store(collection))
+
+
+def _copy_range(src, dst, start, stop):
+    with open(src, "rb") as fsrc, open(dst, "r+b") as fdst:
+        fsrc.seek(start)
+        fdst.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            block = fsrc.read(min(remaining, 8 * 1024 * 1024))
+            if not block:
+                break
+            fdst.write(block)
+            remaining -= len(block)
+
+
+def _copy_file(pool, src, dst):
+    """Copy one file; large files are split into ranges copied by the pool"""
+    size = os.path.getsize(src)
+    if size <= COPY_SPLIT_BYTES:
+        return [pool.submit(shutil.copy2, src, dst)]
+    with open(dst, "wb") as f:
+        f.truncate(size)
+    return [
+        pool.submit(_copy_range, src, dst, start, min(start + COPY_SPLIT_BYTES, size))
+        for start in range(0, size, COPY_SPLIT_BYTES)
+    ]
 
 
 def copy_chroma_to_tmp():
     dst_chroma_path = get_runtime_chroma_path()
 
-    if not os.path.exists(dst_chroma_path):
-        os.makedirs(dst_chroma_path)
-
-    tmp_contents = os.listdir(dst_chroma_path)
-    if len(tmp_contents) == 0:
-        print(f"Copying ChromaDB from {CHROMA_PATH} to {dst_chroma_path}")
-        os.makedirs(dst_chroma_path, exist_ok=True)
-        shutil.copytree(CHROMA_PATH, dst_chroma_path, dirs_exist_ok=True)
-    else:
+    # The marker is written last, so a copy cut short by a crash is redone rather than used.
+    if os.path.exists(os.path.join(dst_chroma_path, COPY_COMPLETE_MARKER)):
         print(f"✅ ChromaDB already exists in {dst_chroma_path}")
+        return
+
+    print(f"Copying ChromaDB from {CHROMA_PATH} to {dst_chroma_path}")
+    with startup_phase("copy"), ThreadPoolExecutor(max_workers=COPY_WORKERS) as pool:
+        futures = []
+        for root, _dirs, files in os.walk(CHROMA_PATH):
+            target = os.path.join(dst_chroma_path, os.path.relpath(root, CHROMA_PATH))
+            os.makedirs(target, exist_ok=True)
+            for name in files:
+                futures.extend(_copy_file(pool, os.path.join(root, name), os.path.join(target, name)))
+        for future in futures:
+            future.result()
+    open(os.path.join(dst_chroma_path, COPY_COMPLETE_MARKER), "w").close()
+
+
+def start_copy_chroma_to_tmp():
+    """Start copying the store in the background, once per process, and return its future"""
+    global COPY_FUTURE
+    with _STARTUP_LOCK:
+        if COPY_FUTURE is None:
+            COPY_FUTURE = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-copy").submit(copy_chroma_to_tmp)
+        return COPY_FUTURE
 
 
 def get_runtime_chroma_path():
-    if IS_USING_IMAGE_RUNTIME:
+    if get_cold_start_mode() != "in_place":
         return f"/tmp/{CHROMA_PATH}"
     else:
-        return CHROMA_PATH
\ No newline at end of file
+        return CHROMA_PATH
+
+
+if IS_USING_IMAGE_RUNTIME and get_cold_start_mode() == "background":
+    # Overlaps the copy with the rest of the imports and the model warm-up.
+    start_copy_chroma_to_tmp()
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Collections kept open at once; with MAX_OPEN_COLLECTIONS_MB also a bound on the memory their
+# flat vectors and BM25 indexes hold (0 for none). The least recently used collection is closed first.
+# Chroma keeps its HNSW indexes in its own client cache and snapshots are memory-mapped, the
+# memory bound sees neither.
+MAX_OPEN_COLLECTIONS = int(os.environ.get("MAX_OPEN_COLLECTIONS", "8"))
+MAX_OPEN_COLLECTIONS_MB = float(os.environ.get("MAX_OPEN_COLLECTIONS_MB", "0"))
+
+
+class CollectionHandles:
+    """Per-collection resources (the store, its BM25 index, its answer cache), least recently used evicted first
+
+    One instance serves queries (chromadb.get_collection_handles), another ingestion (create_db).
+
+    A collection's resources are evicted together once more than max_open collections
+    are open, or, with max_bytes set, once the resources with a memory_bytes() (flat vectors,
+    BM25 indexes) hold more than that.
+    The collection being used is never evicted, even when it alone is over the bound.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_COLLECTIONS, max_bytes=MAX_OPEN_COLLECTIONS_MB * 1024 * 1024):
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.opened = 0
+        self.evictions = 0
+        self._handles = OrderedDict()  # collection -> {resource name: object}, least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, collection, resource, factory):
+        with self._lock:
+            handle = self._handles.get(collection)
+            if handle is not None and resource in handle:
+                self._handles.move_to_end(collection)
+                return handle[resource]
+        # Opened outside the lock, so loading one collection doesn't hold up queries on the others.
+        value = factory()
+        with self._lock:
+            if collection not in self._handles:
+                self._handles[collection] = {}
+                self.opened += 1
+            self._handles.move_to_end(collection)
+            # Another thread may have opened it meanwhile, everyone shares the first one.
+            value = self._handles[collection].setdefault(resource, value)
+            self._evict()
+        return value
+
+    @staticmethod
+    def _memory_bytes(handle):
+        return sum(value.memory_bytes() for value in handle.values() if hasattr(value, "memory_bytes"))
+
+    def close(self, collection):
+        """Drop a collection's resources, e.g. once its store was deleted"""
+        with self._lock:
+            self._handles.pop(collection, None)
+
+    def _evict(self):
+        while len(self._handles) > 1:
+            over_count = len(self._handles) > self.max_open
+            over_memory = self.max_bytes and sum(map(self._memory_bytes, self._handles.values())) > self.max_bytes
+            if not (over_count or over_memory):
+                break
+            # Only the references are dropped: a query still running on it keeps its handle alive until it ends.
+            collection, _ = self._handles.popitem(last=False)
+            self.evictions += 1
+            print(f"Closed collection {collection} (least recently used)")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": {
+                    collection: round(self._memory_bytes(handle) / 1024**2, 2)
+                    for collection, handle in reversed(self._handles.items())
+                },
+                "max_open": self.max_open,
+                "max_mb": self.max_bytes / 1024**2 or None,
+                "opened": self.opened,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,36 @@
+import os
+import re
+
+# Collection used when a request or command names none; ingestion always wrote to this one.
+DEFAULT_COLLECTION = os.environ.get("DEFAULT_COLLECTION", "restaurant_reviews")
+# Sources, manifests and caches of the other collections, one directory each.
+COLLECTIONS_DIR = os.environ.get("COLLECTIONS_DIR", "data/collections")
+# Chroma's own naming rule: 3-63 characters, starting and ending with a letter or digit.
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+
+
+def resolve_collection(collection=None):
+    """The collection to use, DEFAULT_COLLECTION when none is given; raises ValueError for invalid names"""
+    if not collection:
+        return DEFAULT_COLLECTION
+    if not COLLECTION_NAME_PATTERN.match(collection):
+        raise ValueError(
+            f"Invalid collection name {collection!r}: 3-63 letters, digits, '_' or '-', "
+            "starting and ending with a letter or digit"
+        )
+    return collection
+
+
+def collection_path(collection, default_path, name):
+    """default_path for the default collection, so existing data keeps its place, else COLLECTIONS_DIR/<collection>/name"""
+    if collection == DEFAULT_COLLECTION:
+        return default_path
+    return os.path.join(COLLECTIONS_DIR, collection, name)
+
+
+def store_file_name(name, collection):
+    """Name of a per-collection file or directory inside the store, e.g. bm25_index.pkl -> bm25_index.<collection>.pkl"""
+    if collection == DEFAULT_COLLECTION:
+        return name
+    root, extension = os.path.splitext(name)
+    return f"{root}.{collection}{extension}"
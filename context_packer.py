@@ -0,0 +1,108 @@
+import os
+import re
+
+# Prompt budget for the retrieved context, 0 joins the chunks verbatim as before.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2048"))
+# Rough characters per token, close enough for English text on qwen/llama tokenizers.
+CHARS_PER_TOKEN = float(os.environ.get("CHARS_PER_TOKEN", "4"))
+# Share of a chunk's word shingles found in one already selected block that makes it a near-duplicate.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# Longest overlap looked for between neighbouring chunks (split_documents uses 120).
+MAX_OVERLAP_CHARS = 400
+# Shorter matches are coincidence ("...line" / "energy..."), not the splitter's overlap.
+MIN_OVERLAP_CHARS = 20
+SHINGLE_SIZE = 3
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _parse_chunk_id(chunk_id):
+    # IDs look like "data/source/monopoly.pdf:6:2", the source itself may contain ":".
+    page_id, _, index = (chunk_id or "").rpartition(":")
+    if not page_id or not index.isdigit():
+        return None, None
+    return page_id, int(index)
+
+
+def overlap_size(previous, text):
+    """Length of the start of text that repeats the end of previous, 0 if they don't overlap"""
+    longest = min(len(previous), len(text), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        # The overlap ends on a word boundary, a match cutting a word in half is not one.
+        at_boundary = size == len(text) or text[size].isspace() or text[size - 1].isspace()
+        if at_boundary and previous.endswith(text[:size]):
+            return size
+    return 0
+
+
+def strip_overlap(previous, text):
+    """Drop the start of text that repeats the end of previous"""
+    return text[overlap_size(previous, text):]
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+
+
+def _merge_neighbours(results):
+    """Merge chunks that follow each other on the same source page into blocks, best rank first"""
+    blocks = []  # [best rank, page id, [(index, text)]]
+    by_page = {}
+    for rank, (doc, _score) in enumerate(results):
+        page_id, index = _parse_chunk_id(doc.metadata.get("id"))
+        if page_id is None:
+            blocks.append([rank, None, [(None, doc.page_content)]])
+            continue
+        if page_id not in by_page:
+            by_page[page_id] = [rank, page_id, []]
+            blocks.append(by_page[page_id])
+        by_page[page_id][2].append((index, doc.page_content))
+
+    merged = []
+    for rank, page_id, chunks in blocks:
+        chunks.sort(key=lambda chunk: -1 if chunk[0] is None else chunk[0])
+        texts, last_index = [], None
+        for index, text in chunks:
+            if last_index is not None and index == last_index + 1:
+                # Neighbouring chunks share up to chunk_overlap characters, keep them once.
+                size = overlap_size(texts[-1], text)
+                texts[-1] += text[size:] if size else "\n" + text
+            elif last_index is not None and index == last_index:
+                continue
+            else:
+                texts.append(text)
+            last_index = index
+        merged.extend((rank, text) for text in texts)
+    return [text for _rank, text in sorted(merged, key=lambda block: block[0])]
+
+
+def pack_context(results, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Build the prompt context from (doc, score) results, ordered best first"""
+    if token_budget <= 0:
+        return CONTEXT_SEPARATOR.join([doc.page_content for doc, _score in results])
+
+    selected, selected_shingles = [], []
+    used_tokens = 0
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+    for text in _merge_neighbours(results):
+        shingles = _shingles(text)
+        # Containment rather than Jaccard, so a chunk already covered by a merged block is dropped too.
+        if any(len(shingles & other) / len(shingles) >= NEAR_DUPLICATE_THRESHOLD for other in selected_shingles):
+            continue
+
+        cost = estimate_tokens(text) + (separator_tokens if selected else 0)
+        if used_tokens + cost > token_budget:
+            if selected:
+                # Lower-ranked blocks may still fit, keep looking.
+                continue
+            # Never return an empty context: cut the best block down to the budget.
+            text = text[:int(token_budget * CHARS_PER_TOKEN)]
+            cost = estimate_tokens(text)
+        selected.append(text)
+        selected_shingles.append(shingles)
+        used_tokens += cost
+    return CONTEXT_SEPARATOR.join(selected)
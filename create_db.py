@@ -1,16 +1,44 @@
 import argparse
+import asyncio
 import os
 import shutil
-from langchain_community.document_loaders import PyPDFDirectoryLoader
+from contextlib import contextmanager
+from langchain_community.document_loaders import PyPDFDirectoryLoader, PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import chromadb
 #from langchain_community.vectorstores import Chroma
 from langchain_chroma import Chroma
-#from embeddings import get_embedding_function
+from embeddings import get_embedding_function
+from manifest import MANIFEST_PATH, load_manifest, save_manifest, clear_manifest, diff_source_dir, apply_diff
+from pdf_loader import LOAD_WORKERS, list_pdf_files, load_pdfs_parallel
+from ingest_pipeline import run_ingest_pipeline, embed_and_upsert, find_existing_ids
+from answer_cache import bump_collection_version
+from bm25_index import BM25_INDEX_FILENAME, BM25Index
+from flat_index import FLAT_INDEX_DIRNAME, FlatVectorStore
+from metrics import stage_timer
+from collection_handles import CollectionHandles
+from collection_paths import collection_path, resolve_collection, store_file_name
+from web_fetcher import WEB_CACHE_PATH, load_web_cache, save_web_cache, clear_web_cache, fetch_urls, to_document
 
 CHROMA_PATH = "data/chroma"
 DATA_SOURCE_PATH = "data/source"
+DELETE_BATCH_SIZE = 1000
+REBUILD_BATCH_SIZE = 1000
+# "chroma" or "flat" (in-process NumPy index, see flat_index.py).
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+# Collection -> ingestion store and BM25 index handles, bounded like the query side's: the ingest
+# worker runs in the API process, every collection ever ingested into must not stay loaded there.
+INGEST_HANDLES = CollectionHandles()
+# Held for a whole ingestion run, so the CLI and the API's ingest worker never write one collection at once.
+WRITE_LOCK_FILENAME = "ingest.lock"
+WRITE_LOCK_DEPTHS = {}  # Collection -> runs nested in this process (import_snapshot runs clear_database)
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: runs are serialized within a process only.
+    fcntl = None
 
 
 def main():
@@ -18,20 +46,42 @@ def main():
     # Check if the database should be cleared (using the --clear flag).
     parser = argparse.ArgumentParser()
     parser.add_argument("--reset", action="store_true", help="Reset the database.")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="Number of processes used to parse PDFs.")
+    parser.add_argument("--urls", help="File with one URL per line to (re)crawl after the PDFs.")
+    parser.add_argument("--collection", help="Collection to build, its PDFs are read from its own source directory.")
+    parser.add_argument("--rebuild-bm25", action="store_true", help="Rebuild the BM25 index from the chunks in the store.")
     args = parser.parse_args()
     if args.reset:
         print("✨ Clearing Database")
-        clear_database()
+        clear_database(args.collection)
+    if args.rebuild_bm25:
+        rebuild_lexical_index(args.collection)
 
     # Create (or update) the data store.
-    documents = load_documents()
-    chunks = split_documents(documents)
-    add_to_chroma(chunks)
+    update_chroma(workers=args.workers, collection=args.collection)
+    if args.urls:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            update_web([line.strip() for line in f if line.strip() and not line.startswith("#")], args.collection)
+
+
+def load_documents(paths=None, workers=LOAD_WORKERS):
+    if workers > 1:
+        if paths is None:
+            paths = list_pdf_files(DATA_SOURCE_PATH)
+        return load_pdfs_parallel(paths, workers=workers)
 
+    # Without explicit paths, load everything under the source directory.
+    if paths is None:
+        document_loader = PyPDFDirectoryLoader(DATA_SOURCE_PATH)
+        return document_loader.load()
 
-def load_documents():
-    document_loader = PyPDFDirectoryLoader(DATA_SOURCE_PATH)
-    return document_loader.load()
+    documents = []
+    for path in paths:
+        pages = PyPDFLoader(path).load()
+        for page in pages:
+            page.metadata["source"] = path
+        documents.extend(pages)
+    return documents
 
 
 def split_documents(documents: list[Document]):
@@ -44,44 +94,127 @@ def split_documents(documents: list[Document]):
     return text_splitter.split_documents(documents)
 
 
-def add_to_chroma(chunks: list[Document]):
-    # Load the existing database.
-    #db = Chroma(
-    #    persist_directory=CHROMA_PATH, embedding_function=get_embedding_function()
-    #)
-    from langchain.embeddings import OllamaEmbeddings
+def get_source_path(collection=None):
+    # The default collection keeps data/source, the others get their own source directory.
+    return collection_path(resolve_collection(collection), DATA_SOURCE_PATH, "source")
 
-    embeddings = OllamaEmbeddings(model="mxbai-embed-large")
 
-    db = Chroma(
-    collection_name="restaurant_reviews",
-    persist_directory=CHROMA_PATH,
-    embedding_function=embeddings
-    )
+def get_ingest_db(collection=None):
+    # Load each existing collection once and reuse it, along with its embedding client, for every upload.
+    collection = resolve_collection(collection)
+    if VECTOR_BACKEND == "flat":
+        return INGEST_HANDLES.get(collection, "db", lambda: FlatVectorStore(
+            os.path.join(CHROMA_PATH, store_file_name(FLAT_INDEX_DIRNAME, collection)),
+            embedding_function=get_embedding_function()
+        ))
+    return INGEST_HANDLES.get(collection, "db", lambda: Chroma(
+        collection_name=collection,
+        persist_directory=CHROMA_PATH,
+        embedding_function=get_embedding_function()
+    ))
+
+
+def save_indexes(collection=None):
+    # Chroma persists on its own; the BM25 and flat indexes are written out explicitly.
+    get_lexical_index(collection).save()
+    save = getattr(get_ingest_db(collection), "save", None)
+    if save:
+        save()
+
+
+def get_lexical_index(collection=None):
+    # BM25 index kept next to the Chroma collection for hybrid retrieval.
+    collection = resolve_collection(collection)
+    return INGEST_HANDLES.get(collection, "bm25", lambda: BM25Index(
+        os.path.join(CHROMA_PATH, store_file_name(BM25_INDEX_FILENAME, collection))
+    ))
+
+
+@contextmanager
+def write_lock(collection=None):
+    """One ingestion run at a time per collection; the cached handles are brought up to date first"""
+    collection = resolve_collection(collection)
+    if WRITE_LOCK_DEPTHS.get(collection):
+        WRITE_LOCK_DEPTHS[collection] += 1
+        try:
+            yield
+        finally:
+            WRITE_LOCK_DEPTHS[collection] -= 1
+        return
+
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    with open(os.path.join(CHROMA_PATH, store_file_name(WRITE_LOCK_FILENAME, collection)), "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        WRITE_LOCK_DEPTHS[collection] = 1
+        try:
+            # Another process may have saved since these handles were last used,
+            # writing from a stale copy would save over its chunks.
+            refresh = getattr(get_ingest_db(collection), "refresh", None)
+            if refresh:
+                refresh()
+            get_lexical_index(collection).refresh()
+            yield
+        except BaseException:
+            # Unsaved changes of a failed run must not be saved by the next one.
+            INGEST_HANDLES.close(collection)
+            raise
+        finally:
+            WRITE_LOCK_DEPTHS[collection] = 0
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def rebuild_lexical_index(collection=None):
+    # Stores built before hybrid retrieval have no BM25 index, index every chunk already in the store.
+    collection = resolve_collection(collection)
+    with write_lock(collection):
+        db = get_ingest_db(collection)
+        lexical_index = get_lexical_index(collection)
+        lexical_index.remove(list(lexical_index.doc_terms))
+        if VECTOR_BACKEND == "flat":
+            batches = [db.get(include=["documents"])]
+        else:
+            batches = (
+                db.get(include=["documents"], limit=REBUILD_BATCH_SIZE, offset=offset)
+                for offset in range(0, db._collection.count(), REBUILD_BATCH_SIZE)
+            )
+        for batch in batches:
+            lexical_index.add(batch["ids"], batch["documents"])
+        print(f"✅ Rebuilt BM25 index with {len(lexical_index.doc_terms)} chunks")
+        save_indexes(collection)
+        bump_collection_version(collection)
+
+
+def add_to_chroma(chunks: list[Document], collection=None):
+    with write_lock(collection):
+        db = get_ingest_db(collection)
     
 
-    # Calculate Page IDs.
-    chunks_with_ids = calculate_chunk_ids(chunks)
-    for chunk in chunks:
-        print(f"Chunk Page Sample: {chunk.metadata['id']}\n{chunk.page_content}\n\n")
+        # Calculate Page IDs.
+        chunks_with_ids = calculate_chunk_ids(chunks)
+        for chunk in chunks:
+            print(f"Chunk Page Sample: {chunk.metadata['id']}\n{chunk.page_content}\n\n")
 
-    # Add or Update the documents.
-    existing_items = db.get(include=[])  # IDs are always included by default
-    existing_ids = set(existing_items["ids"])
-    print(f"Number of existing documents in DB: {len(existing_ids)}")
+        # Add or Update the documents.
+        # Only look up the candidate IDs, so the cost follows the upload and not the collection.
+        with stage_timer("ingest_lookup"):
+            existing_ids = find_existing_ids(db, [chunk.metadata["id"] for chunk in chunks_with_ids])
+        print(f"Number of chunks already in DB: {len(existing_ids)}")
 
-    # Only add documents that don't exist in the DB.
-    new_chunks = []
-    for chunk in chunks_with_ids:
-        if chunk.metadata["id"] not in existing_ids:
-            new_chunks.append(chunk)
+        # Only add documents that don't exist in the DB.
+        new_chunks = []
+        for chunk in chunks_with_ids:
+            if chunk.metadata["id"] not in existing_ids:
+                new_chunks.append(chunk)
 
-    if len(new_chunks):
-        print(f"👉 Adding new documents: {len(new_chunks)}")
-        new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
-        db.add_documents(new_chunks, ids=new_chunk_ids)
-    else:
-        print("✅ No new documents to add")
+        if len(new_chunks):
+            print(f"👉 Adding new documents: {len(new_chunks)}")
+            embed_and_upsert(db, new_chunks, lexical_index=get_lexical_index(collection))
+            save_indexes(collection)
+            bump_collection_version(collection)
+        else:
+            print("✅ No new documents to add")
 
 
 def calculate_chunk_ids(chunks):
@@ -113,9 +246,109 @@ def calculate_chunk_ids(chunks):
     return chunks
 
 
-def clear_database():
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
+def remove_from_chroma(ids: list[str], collection=None):
+    db = get_ingest_db(collection)
+    print(f"🗑️ Removing stale documents: {len(ids)}")
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        db.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+    get_lexical_index(collection).remove(ids)
+
+
+def update_chroma(workers=LOAD_WORKERS, progress=None, collection=None):
+    # Only load, split and embed the files that are new or changed since the last run.
+    collection = resolve_collection(collection)
+    with write_lock(collection):
+        manifest_path = collection_path(collection, MANIFEST_PATH, "manifest.json")
+        manifest = load_manifest(manifest_path)
+        diff = diff_source_dir(manifest, get_source_path(collection))
+        print(f"Manifest: {len(diff.changed)} new or changed, {len(diff.removed)} removed")
+
+        if diff.stale_ids:
+            remove_from_chroma(diff.stale_ids, collection)
+
+        # Pages stream through split, embed and upsert in batches instead of being held in memory.
+        chunk_ids = {}
+        if diff.changed:
+            chunk_ids = run_ingest_pipeline(
+                diff.changed, get_ingest_db(collection), split_documents, calculate_chunk_ids,
+                workers=workers, lexical_index=get_lexical_index(collection), progress=progress
+            )
+        else:
+            print("✅ No new or changed files to ingest")
+
+        # Cached answers may quote removed or replaced chunks, so any change invalidates them.
+        if diff.changed or diff.stale_ids:
+            save_indexes(collection)
+            bump_collection_version(collection)
+
+        save_manifest(apply_diff(manifest, diff, chunk_ids), manifest_path)
+
+
+def update_web(urls: list[str], collection=None, progress=None):
+    # Fetch all pages concurrently, unchanged ones are skipped before splitting or embedding.
+    collection = resolve_collection(collection)
+    with write_lock(collection):
+        cache_path = collection_path(collection, WEB_CACHE_PATH, "web_cache.json")
+        cache = load_web_cache(cache_path)
+        results = asyncio.run(fetch_urls(urls, cache))
+        changed = [result for result in results if result.status == "changed"]
+        for result in results:
+            if result.status == "failed":
+                print(f"⚠️ Could not fetch {result.url}: {result.error}")
+        print(f"Web: {len(changed)} new or changed, {len(results) - len(changed)} unchanged or failed")
+        if progress is not None:
+            progress.add(pages=len(results))
+        # Same body, but the server may have new validators; keeping the old ones would
+        # cost a full download of the page on every later crawl.
+        refreshed = [result for result in results if result.status == "unchanged" and result.validators]
+        for result in refreshed:
+            cache["urls"].setdefault(result.url, {}).update(result.validators)
+        if not changed:
+            if refreshed:
+                save_web_cache(cache, cache_path)
+            return results
+
+        stale_ids = [id for result in changed for id in cache["urls"].get(result.url, {}).get("chunk_ids", [])]
+        if stale_ids:
+            remove_from_chroma(stale_ids, collection)
+
+        chunks = calculate_chunk_ids(split_documents([to_document(result) for result in changed]))
+        if progress is not None:
+            progress.add(chunks=len(chunks))
+        embed_and_upsert(get_ingest_db(collection), chunks, lexical_index=get_lexical_index(collection), progress=progress)
+
+        chunk_ids = {}
+        for chunk in chunks:
+            chunk_ids.setdefault(chunk.metadata["source"], []).append(chunk.metadata["id"])
+        for result in changed:
+            cache["urls"][result.url] = {**result.validators, "chunk_ids": chunk_ids.get(result.url, [])}
+
+        save_indexes(collection)
+        bump_collection_version(collection)
+        save_web_cache(cache, cache_path)
+        return results
+
+
+def clear_database(collection=None):
+    # Only this collection is dropped, the others in the same store stay as they are.
+    collection = resolve_collection(collection)
+    with write_lock(collection):
+        if VECTOR_BACKEND == "flat":
+            INGEST_HANDLES.close(collection)
+            flat_path = os.path.join(CHROMA_PATH, store_file_name(FLAT_INDEX_DIRNAME, collection))
+            if os.path.exists(flat_path):
+                shutil.rmtree(flat_path)
+        else:
+            get_ingest_db(collection).delete_collection()
+            # Drop the handles so the next ingestion opens the recreated collection.
+            INGEST_HANDLES.close(collection)
+        bm25_path = os.path.join(CHROMA_PATH, store_file_name(BM25_INDEX_FILENAME, collection))
+        if os.path.exists(bm25_path):
+            os.remove(bm25_path)
+        # The manifest describes what is in the store, so it goes with it.
+        clear_manifest(collection_path(collection, MANIFEST_PATH, "manifest.json"))
+        clear_web_cache(collection_path(collection, WEB_CACHE_PATH, "web_cache.json"))
+        bump_collection_version(collection)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+# 0 disables the cache.
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024**3)))
+# When the cache is full, evict least recently used entries down to this fraction of the limit.
+EVICTION_TARGET = 0.9
+# Keep well under SQLite's bound-parameter limit.
+LOOKUP_BATCH_SIZE = 500
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Persistent embedding cache keyed by (model name and client version, hash of the text)
+
+    The version stands for everything besides the model that changes the vectors
+    (the client, its normalization); a new one stops serving vectors of the old one.
+    """
+
+    def __init__(self, embeddings, model_name, version, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        self.embeddings = embeddings
+        self.model_name = f"{model_name}@{version}"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL lets the API and the ingestion process read while the other one writes.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        # Vectors of other versions of this model can never be served again.
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model = ? OR model LIKE ?) AND model != ?",
+            [model_name, f"{model_name}@%", self.model_name],
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def _lookup(self, hashes):
+        found = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *batch],
+            )
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def _stored_bytes(self, hashes):
+        size = 0
+        for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            size += self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *batch],
+            ).fetchone()[0]
+        return size
+
+    def _store(self, vectors_by_hash):
+        now = time.time()
+        rows = [(self.model_name, key, array("f", vector).tobytes(), now) for key, vector in vectors_by_hash.items()]
+        # Another process may have stored some of them meanwhile; replaced rows don't add to the size.
+        replaced = self._stored_bytes(list(vectors_by_hash))
+        self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+        self._size += sum(len(row[2]) for row in rows) - replaced
+        if self._size > self.max_bytes:
+            self._evict()
+        self._conn.commit()
+
+    def _touch(self, hashes):
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+            [(now, self.model_name, key) for key in hashes],
+        )
+        self._conn.commit()
+
+    def _evict(self):
+        target = int(self.max_bytes * EVICTION_TARGET)
+        rows = self._conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used")
+        evicted = []
+        for rowid, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((rowid,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", evicted)
+        print(f"🧹 Evicted {len(evicted)} cached embeddings")
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(set(hashes)))
+            if cached:
+                self._touch(list(cached))
+            hits = sum(1 for key in hashes if key in cached)
+            self.hits += hits
+            self.misses += len(hashes) - hits
+
+        # Embed each missing text once, even if it appears several times in the batch.
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            with self._lock:
+                self._store(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text):
+        # Not cached on purpose: queries rarely repeat verbatim, and one-off queries would evict
+        # document vectors from the LRU. Repeated questions are served by the answer cache instead.
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size_bytes": self._size,
+        }
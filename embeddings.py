@@ -1,7 +1,21 @@
-from langchain_community.embeddings import OllamaEmbeddings
+# langchain_ollama sends a whole batch of texts in one /api/embed request.
+from langchain_ollama import OllamaEmbeddings
+from embedding_cache import EMBEDDING_CACHE_MAX_BYTES, CachedEmbeddings
+
+EMBEDDING_MODEL = "mxbai-embed-large"
+# Part of the embedding cache key: bump it whenever a client change alters the vectors
+# returned for the same model, e.g. /api/embed normalizing them where /api/embeddings did not.
+EMBEDDING_CLIENT_VERSION = "ollama-embed-2"
+
 def get_embedding_function():
-    embeddings = OllamaEmbeddings(model="mxbai-embed-large")
+    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    if EMBEDDING_CACHE_MAX_BYTES > 0:
+        embeddings = CachedEmbeddings(embeddings, EMBEDDING_MODEL, EMBEDDING_CLIENT_VERSION)
     return embeddings
 
+def get_query_embedding_function():
+    # Query text rarely repeats, so skip the on-disk document cache.
+    return OllamaEmbeddings(model=EMBEDDING_MODEL)
+
 
 
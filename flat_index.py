@@ -0,0 +1,401 @@
+import asyncio
+import os
+import pickle
+import re
+import shutil
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+from quantization import QUANTIZATIONS, approximate_scores, code_shape, encode
+
+# Stored inside the Chroma directory so it is cleared, copied and shipped together with it.
+FLAT_INDEX_DIRNAME = "flat_index"
+VECTORS_FILENAME = "vectors.f32"
+TABLE_FILENAME = "table.pkl"
+# Holds "<generation> <save>", what readers should load; replaced atomically on save.
+CURRENT_FILENAME = "CURRENT"
+GENERATION_DIR_PATTERN = re.compile(r"^generation-(\d+)$")
+INITIAL_CAPACITY = 1024
+# Compact copy searched first: float32 (none), float16, int8 or binary. Unset uses what ingestion saved.
+FLAT_INDEX_QUANTIZATION = os.environ.get("FLAT_INDEX_QUANTIZATION")
+# Candidates rescored with full-precision vectors, as a multiple of k.
+RESCORE_MULTIPLIER = int(os.environ.get("RESCORE_MULTIPLIER", "10"))
+
+
+class FlatVectorStore:
+    """Exact top-k search over a memory-mapped float32 matrix of unit vectors
+
+    Rows are kept contiguous: row i of the matrix belongs to ids[i], metadatas[i]
+    and documents[i]. Deleting a row moves the last row into its place.
+    Implements the parts of the langchain Chroma API that ingestion and query_rag use.
+
+    Every save publishes a generation: a directory with the matrix, the codes and
+    the table, made current by replacing the CURRENT file. Rows readers can see
+    are never written again. New rows are appended after them in the same matrix
+    file, so adding chunks costs only the new rows. Changing or deleting a visible
+    row, or outgrowing the file, copies the rows into a new generation instead,
+    which costs O(collection size) once per save that deletes or replaces chunks.
+    Readers in other processes therefore always map a matrix that matches the
+    table they loaded with it.
+
+    With a quantization other than float32, a compact copy of the matrix is held
+    in memory and searched first. Only the best k * RESCORE_MULTIPLIER candidates
+    are rescored against the full-precision rows, which stay on disk.
+    """
+
+    def __init__(self, path, embedding_function=None, read_only=False, quantization=FLAT_INDEX_QUANTIZATION,
+                 rescore_multiplier=RESCORE_MULTIPLIER):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+        self.path = path
+        self.embedding_function = embedding_function
+        self.read_only = read_only  # Serving handles: upsert, delete and save raise
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
+        self.dim = None
+        self.ids = []
+        self.metadatas = []
+        self.documents = []
+        self.positions = {}  # chunk id -> row
+        self._matrix = None
+        self._codes = None
+        self._scales = None
+        self.generation = None  # Generation loaded, or being written when not published yet
+        self.version = None  # (generation, save) last loaded or published
+        self._published = True  # No changes since the last load or save
+        self._shared = False  # The generation written to is the one readers load
+        self._visible_rows = 0  # Rows of a shared generation readers may map, never written again
+        self._lock = threading.RLock()
+        self.refresh()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _generation_dir(self, generation):
+        # Generation 0 is a store saved before generations existed, its files are at the top level.
+        if generation == 0:
+            return self.path
+        return os.path.join(self.path, f"generation-{generation}")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self._generation_dir(self.generation), VECTORS_FILENAME)
+
+    @property
+    def _table_path(self):
+        return os.path.join(self._generation_dir(self.generation), TABLE_FILENAME)
+
+    @property
+    def _current_path(self):
+        return os.path.join(self.path, CURRENT_FILENAME)
+
+    def _current_version(self):
+        try:
+            with open(self._current_path, "r", encoding="utf-8") as f:
+                fields = [int(field) for field in f.read().split()]
+        except FileNotFoundError:
+            return (0, 0) if os.path.exists(os.path.join(self.path, TABLE_FILENAME)) else None
+        # Stores saved before in-place appends hold only the generation.
+        return fields[0], fields[1] if len(fields) > 1 else 0
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"Flat index {self.path} was opened read-only")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        # An empty store is still a valid singleton instance.
+        return True
+
+    @property
+    def _quantized(self):
+        return self.quantization not in (None, "float32")
+
+    def _codes_path(self, name):
+        return os.path.join(self._generation_dir(self.generation), f"{name}.{self.quantization}.npy")
+
+    def _load_codes(self):
+        count = len(self.ids)
+        try:
+            codes = np.load(self._codes_path("codes"))
+            scales = np.load(self._codes_path("scales")) if self.quantization == "int8" else None
+        except FileNotFoundError:
+            codes = None
+        if codes is not None and len(codes) > count:
+            # Saved after the table was read; the rows it shares with the table are unchanged.
+            codes, scales = codes[:count], None if scales is None else scales[:count]
+        if codes is None or len(codes) != count:
+            # Missing or out of date, rebuild from the full-precision rows.
+            print(f"Building {self.quantization} codes for {count} vectors in {self.path}")
+            codes, scales = encode(self.quantization, self._matrix[:count]) if count else (None, None)
+        self._codes, self._scales = None, None
+        self._reserve_codes(max(count, 1))
+        if count:
+            self._codes[:count] = codes
+            if scales is not None:
+                self._scales[:count] = scales
+
+    def _reserve_codes(self, rows):
+        capacity = 0 if self._codes is None else len(self._codes)
+        if rows <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        shape, dtype = code_shape(self.quantization, self.dim)
+        codes = np.zeros((new_capacity, *shape), dtype=dtype)
+        scales = np.ones(new_capacity, dtype=np.float32) if self.quantization == "int8" else None
+        count = len(self.ids)
+        if capacity:
+            codes[:min(count, capacity)] = self._codes[:min(count, capacity)]
+            if scales is not None:
+                scales[:min(count, capacity)] = self._scales[:min(count, capacity)]
+        self._codes, self._scales = codes, scales
+
+    def memory_bytes(self):
+        """Bytes held in RAM by the searched vectors (the float32 matrix counts only when searched directly)"""
+        count = len(self.ids)
+        if not count:
+            return 0
+        if not self._quantized:
+            return count * self.dim * 4
+        size = self._codes[:count].nbytes
+        if self._scales is not None:
+            size += self._scales[:count].nbytes
+        return size
+
+    def refresh(self):
+        """Load the current generation if another process (ingestion) published a newer one"""
+        version = self._current_version()
+        if version == self.version:
+            return
+        with self._lock:
+            # Concurrent queries all call refresh, only the first of them loads the new version.
+            version = self._current_version()
+            if version == self.version:
+                return
+            if not self._published:
+                # Unsaved changes of this writer are newer than anything on disk.
+                return
+            if version is None:
+                # Removed since it was loaded, the collection was cleared.
+                self.dim, self.ids, self.metadatas, self.documents, self.positions = None, [], [], [], {}
+                self._matrix, self._codes, self._scales = None, None, None
+                self.generation, self.version, self._shared, self._visible_rows = None, None, False, 0
+                return
+            generation = version[0]
+            directory = self._generation_dir(generation)
+            try:
+                with open(os.path.join(directory, TABLE_FILENAME), "rb") as f:
+                    table = pickle.load(f)
+                # Published files are read-only for everyone, a writer copies them before changing a row.
+                matrix = np.memmap(os.path.join(directory, VECTORS_FILENAME), dtype=np.float32, mode="r")
+            except FileNotFoundError:
+                # Already replaced and removed by a newer save, the next refresh loads that one.
+                return
+            self.dim = table["dim"]
+            self.ids = table["ids"]
+            self.metadatas = table["metadatas"]
+            self.documents = table["documents"]
+            self.positions = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            if self.quantization is None:
+                self.quantization = table.get("quantization", "float32")
+            self.generation, self.version = generation, version
+            self._shared, self._visible_rows = True, len(self.ids)
+            self._matrix = matrix.reshape(-1, self.dim)
+            self._codes, self._scales = None, None
+            if self._quantized:
+                self._load_codes()
+
+    def _rewrites_visible_rows(self, ids):
+        return self._shared and any(self.positions.get(chunk_id, self._visible_rows) < self._visible_rows for chunk_id in ids)
+
+    def _reserve(self, rows, rewrite=False):
+        """Make room for rows; rewrite means rows readers may have mapped are about to change"""
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity and not (rewrite and self._shared):
+            if self._matrix is not None and not self._matrix.flags.writeable:
+                # Loaded read-only by refresh, rows past the visible ones are appended in place.
+                self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+").reshape(-1, self.dim)
+            self._published = False
+            return
+        # Copied into a new generation, grown by doubling.
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        generation = (self.generation or 0) + 1 if self._shared or self.generation is None else self.generation
+        directory = self._generation_dir(generation)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, VECTORS_FILENAME)
+        tmp_path = f"{path}.tmp"
+        matrix = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(new_capacity, self.dim))
+        if len(self.ids):
+            matrix[:len(self.ids)] = self._matrix[:len(self.ids)]
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, path)
+        self._matrix = np.memmap(path, dtype=np.float32, mode="r+").reshape(-1, self.dim)
+        self.generation, self._published, self._shared = generation, False, False
+
+    def upsert_embeddings(self, ids, embeddings, documents, metadatas):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._check_writable()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if self.quantization is None:
+                self.quantization = "float32"
+            self._reserve(len(self.ids) + len(ids), rewrite=self._rewrites_visible_rows(ids))
+            if self._quantized:
+                self._reserve_codes(len(self.ids) + len(ids))
+                codes, scales = encode(self.quantization, vectors)
+            for position, (chunk_id, vector, document, metadata) in enumerate(zip(ids, vectors, documents, metadatas)):
+                row = self.positions.get(chunk_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.positions[chunk_id] = row
+                    self.ids.append(chunk_id)
+                    self.metadatas.append(metadata)
+                    self.documents.append(document)
+                else:
+                    self.metadatas[row] = metadata
+                    self.documents[row] = document
+                self._matrix[row] = vector
+                if self._quantized:
+                    self._codes[row] = codes[position]
+                    if scales is not None:
+                        self._scales[row] = scales[position]
+
+    def delete(self, ids):
+        with self._lock:
+            self._check_writable()
+            if not any(chunk_id in self.positions for chunk_id in ids):
+                return
+            self._reserve(len(self.ids), rewrite=self._rewrites_visible_rows(ids))
+            for chunk_id in ids:
+                row = self.positions.pop(chunk_id, None)
+                if row is None:
+                    continue
+                last = len(self.ids) - 1
+                if row != last:
+                    self._matrix[row] = self._matrix[last]
+                    if self._quantized:
+                        self._codes[row] = self._codes[last]
+                        if self._scales is not None:
+                            self._scales[row] = self._scales[last]
+                    self.ids[row] = self.ids[last]
+                    self.metadatas[row] = self.metadatas[last]
+                    self.documents[row] = self.documents[last]
+                    self.positions[self.ids[row]] = row
+                self.ids.pop()
+                self.metadatas.pop()
+                self.documents.pop()
+
+    def save(self):
+        """Publish the changes since the last save as a new generation"""
+        with self._lock:
+            self._check_writable()
+            if self._matrix is None or self._published:
+                return
+            self._matrix.flush()
+            count = len(self.ids)
+            if self._quantized:
+                # Saved so readers can load the compact copy instead of re-encoding the matrix.
+                self._replace_file(self._codes_path("codes"), lambda f: np.save(f, self._codes[:count]))
+                if self._scales is not None:
+                    self._replace_file(self._codes_path("scales"), lambda f: np.save(f, self._scales[:count]))
+            self._replace_file(self._table_path, lambda f: pickle.dump(
+                {
+                    "dim": self.dim,
+                    "quantization": self.quantization,
+                    "ids": self.ids,
+                    "metadatas": self.metadatas,
+                    "documents": self.documents,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            ))
+            # Nothing saved is visible until this replace.
+            save = self.version[1] + 1 if self._shared else 0
+            self._replace_file(self._current_path, lambda f: f.write(f"{self.generation} {save}".encode()))
+            self.version = (self.generation, save)
+            self._published, self._shared, self._visible_rows = True, True, count
+            self._remove_old_generations()
+
+    @staticmethod
+    def _replace_file(path, write):
+        # Readers loading the previous file keep reading it whole.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _remove_old_generations(self):
+        # The previous generation stays for readers that read CURRENT just before the replace.
+        keep = self.generation - 1
+        for name in os.listdir(self.path):
+            match = GENERATION_DIR_PATTERN.match(name)
+            if match and int(match.group(1)) < keep:
+                # Readers that still map these files keep them alive until they refresh (on POSIX).
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        if keep > 0:
+            for name in os.listdir(self.path):
+                if name == TABLE_FILENAME or name == VECTORS_FILENAME or name.endswith(".npy"):
+                    try:
+                        os.remove(os.path.join(self.path, name))
+                    except OSError:
+                        pass
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        with self._lock:
+            rows = range(len(self.ids)) if ids is None else [self.positions[i] for i in ids if i in self.positions]
+            result = {"ids": [self.ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self.documents[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self.metadatas[row] for row in rows]
+            return result
+
+    def search_by_vector(self, embedding, k=3):
+        """Return (row, cosine distance) pairs of the k nearest rows"""
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            count = len(self.ids)
+            if not count:
+                return []
+            k = min(k, count)
+            if not self._quantized:
+                scores = self._matrix[:count] @ query
+                # argpartition finds the top k in linear time, only those k are sorted.
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                return [(int(row), float(1.0 - scores[row])) for row in top]
+
+            approximate = approximate_scores(self.quantization, self._codes[:count], self._scales, query)
+            candidates = min(count, k * self.rescore_multiplier)
+            rows = np.sort(np.argpartition(-approximate, candidates - 1)[:candidates])
+            # Sorted rows keep the reads of full-precision vectors from disk in file order.
+            scores = self._matrix[rows] @ query
+            best = np.argsort(-scores)[:k]
+            return [(int(rows[i]), float(1.0 - scores[i])) for i in best]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=3):
+        with self._lock:
+            return [
+                (Document(page_content=self.documents[row], metadata=self.metadatas[row]), distance)
+                for row, distance in self.search_by_vector(embedding, k)
+            ]
+
+    def similarity_search_with_score(self, query, k=3):
+        return self.similarity_search_by_vector_with_relevance_scores(self.embedding_function.embed_query(query), k)
+
+    async def asimilarity_search_with_score(self, query, k=3):
+        return await asyncio.to_thread(self.similarity_search_with_score, query, k)
@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from pdf_loader import count_pages
+from profiling import profiled
+
+# Finished jobs kept around for status lookups.
+MAX_JOB_HISTORY = int(os.environ.get("MAX_JOB_HISTORY", "1000"))
+
+INGEST_QUEUE_INSTANCE = None
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    files: list
+    collection: str = None  # None for the default collection.
+    urls: list = None  # Set for a web crawl, whose "pages" are the URLs.
+    results: list = None  # Per URL status of a finished web crawl.
+    status: str = "queued"  # queued, running, done or failed
+    total_pages: int = 0
+    pages_done: int = 0
+    chunks_done: int = 0
+    embeddings_done: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    error: str = None
+    profile_mode: str = None  # Set to profile the ingestion run, see profiling.py.
+    request_id: str = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    # Progress hooks called by ingest_pipeline.run_ingest_pipeline.
+    def plan(self, paths):
+        total = sum(count_pages(path) for path in paths)
+        with self._lock:
+            self.total_pages = total
+
+    def add(self, pages=0, chunks=0, embeddings=0):
+        with self._lock:
+            self.pages_done += pages
+            self.chunks_done += chunks
+            self.embeddings_done += embeddings
+
+    def eta_seconds(self):
+        if self.status != "running" or not self.pages_done or not self.embeddings_done:
+            return None
+        elapsed = time.time() - self.started_at
+        # Estimate the total chunk count from the chunks per page seen so far.
+        expected_chunks = self.chunks_done / self.pages_done * max(self.total_pages, self.pages_done)
+        return max(expected_chunks - self.embeddings_done, 0) / (self.embeddings_done / elapsed)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "files": self.files,
+                "urls": self.urls,
+                "results": self.results,
+                "collection": self.collection,
+                "status": self.status,
+                "total_pages": self.total_pages,
+                "pages_done": self.pages_done,
+                "chunks_done": self.chunks_done,
+                "embeddings_done": self.embeddings_done,
+                "eta_seconds": self.eta_seconds(),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+            }
+
+
+class IngestJobQueue:
+    """Queue of ingestion jobs run one at a time, so only one writer touches the store"""
+
+    def __init__(self, ingest, ingest_web=None):
+        # ingest(progress, collection) runs one ingestion pass, e.g. documentprocessor.update_chroma.
+        # ingest_web(urls, collection, progress) crawls URLs, e.g. documentprocessor.update_web.
+        self.ingest = ingest
+        self.ingest_web = ingest_web
+        self.jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, files, collection=None, profile_mode=None, request_id=None):
+        job = IngestJob(
+            job_id=uuid.uuid4().hex, files=files, collection=collection, profile_mode=profile_mode, request_id=request_id
+        )
+        return self._enqueue(job)
+
+    def submit_web(self, urls, collection=None, profile_mode=None, request_id=None):
+        # Crawled by the same worker, so web pages never write to the store alongside a PDF job.
+        job = IngestJob(
+            job_id=uuid.uuid4().hex, files=[], collection=collection, urls=urls, total_pages=len(urls),
+            profile_mode=profile_mode, request_id=request_id,
+        )
+        return self._enqueue(job)
+
+    def _enqueue(self, job):
+        with self._lock:
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > MAX_JOB_HISTORY:
+                self.jobs.popitem(last=False)
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                with profiled(job.profile_mode, job.request_id or job.job_id, "ingest_job"):
+                    if job.urls is not None:
+                        results = self.ingest_web(job.urls, collection=job.collection, progress=job)
+                        job.results = [
+                            {"url": result.url, "status": result.status, "error": result.error} for result in results
+                        ]
+                    else:
+                        self.ingest(progress=job, collection=job.collection)
+                job.status = "done"
+            except Exception as e:
+                print(f"❌ Ingest job {job.job_id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+
+
+def get_ingest_queue():
+    global INGEST_QUEUE_INSTANCE
+    if INGEST_QUEUE_INSTANCE is None:
+        # Imported here so the API starts without loading the ingest stack.
+        from documentprocessor import update_chroma, update_web
+        INGEST_QUEUE_INSTANCE = IngestJobQueue(update_chroma, update_web)
+    return INGEST_QUEUE_INSTANCE
@@ -0,0 +1,194 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import INGEST_CHUNKS, INGEST_EMBEDDINGS, INGEST_PAGES, INGEST_RUNNING, stage_timer
+from pdf_loader import LOAD_WORKERS, iter_pdf_pages
+
+# Number of chunks sent in one embedding request and upserted together.
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "64"))
+# Embedding requests in flight against the Ollama server at once.
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.environ.get("EMBED_RETRY_BACKOFF", "1.0"))
+# IDs per existence lookup, kept under SQLite's bound-parameter limit.
+LOOKUP_BATCH_SIZE = 500
+# Batches buffered between two stages before the producer blocks.
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class _StageFailure:
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(q, item, stop):
+    # Block while the consumer is busy, but give up as soon as it has gone away.
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _background(iterable, maxsize=INGEST_QUEUE_SIZE):
+    """Run iterable on its own thread, handing items over through a bounded queue"""
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in iterable:
+                if not _put(q, item, stop):
+                    return
+            _put(q, _DONE, stop)
+        except BaseException as e:
+            _put(q, _StageFailure(e), stop)
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def _chunk_batches(pages, split_documents, calculate_chunk_ids, batch_size, progress=None):
+    batch = []
+    for page in pages:
+        # Splitting one page at a time gives the same IDs as splitting the whole list,
+        # because chunk indexes restart on every page anyway.
+        with stage_timer("ingest_split"):
+            chunks = calculate_chunk_ids(split_documents([page]))
+        batch.extend(chunks)
+        INGEST_PAGES.inc()
+        INGEST_CHUNKS.inc(len(chunks))
+        if progress is not None:
+            progress.add(pages=1, chunks=len(chunks))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _embed_with_retry(embeddings, batch, max_retries=EMBED_MAX_RETRIES, backoff=EMBED_RETRY_BACKOFF):
+    texts = [chunk.page_content for chunk in batch]
+    for attempt in range(max_retries + 1):
+        try:
+            with stage_timer("ingest_embed"):
+                return embeddings.embed_documents(texts)
+        except Exception as e:
+            # Only this batch is retried, everything already upserted stays in place.
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2**attempt
+            print(f"⚠️ Embedding batch of {len(texts)} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _embed_batches(batches, embeddings, concurrency=EMBED_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Keep up to `concurrency` requests in flight and hand results on in batch order.
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(_embed_with_retry, embeddings, batch)))
+            if len(pending) >= concurrency:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+
+def find_existing_ids(db, ids):
+    """Return which of the given IDs are already stored, without scanning the collection"""
+    existing = set()
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        found = db.get(ids=ids[start:start + LOOKUP_BATCH_SIZE], include=[])
+        existing.update(found["ids"])
+    return existing
+
+
+def upsert_chunks(db, batch, vectors):
+    # The flat NumPy backend takes precomputed vectors directly, Chroma through its collection.
+    upsert = getattr(db, "upsert_embeddings", None) or db._collection.upsert
+    with stage_timer("ingest_upsert"):
+        upsert(
+            ids=[chunk.metadata["id"] for chunk in batch],
+            embeddings=vectors,
+            documents=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+        )
+
+
+def _upsert_embedded(db, embedded, lexical_index=None, progress=None):
+    chunk_ids = {}
+    total_chunks = 0
+    start_time = time.perf_counter()
+    with INGEST_RUNNING.track_inprogress():
+        for batch, vectors in embedded:
+            upsert_chunks(db, batch, vectors)
+            if lexical_index is not None:
+                lexical_index.add([chunk.metadata["id"] for chunk in batch], [chunk.page_content for chunk in batch])
+            for chunk in batch:
+                chunk_ids.setdefault(chunk.metadata["source"], []).append(chunk.metadata["id"])
+            total_chunks += len(batch)
+            INGEST_EMBEDDINGS.inc(len(batch))
+            if progress is not None:
+                progress.add(embeddings=len(batch))
+            rate = total_chunks / max(time.perf_counter() - start_time, 1e-9)
+            print(f"👉 Upserted {total_chunks} chunks ({rate:.1f} chunks/s)")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Ingested {total_chunks} chunks in {elapsed:.1f}s ({total_chunks / max(elapsed, 1e-9):.1f} chunks/s)")
+    if hasattr(db.embeddings, "stats"):
+        print(f"Embedding cache: {db.embeddings.stats()}")
+    return chunk_ids
+
+
+def embed_and_upsert(db, chunks, batch_size=INGEST_BATCH_SIZE, concurrency=EMBED_CONCURRENCY, lexical_index=None,
+                     progress=None):
+    """Embed already split chunks in concurrent batches and upsert them"""
+    batches = (chunks[start:start + batch_size] for start in range(0, len(chunks), batch_size))
+    return _upsert_embedded(db, _embed_batches(batches, db.embeddings, concurrency), lexical_index, progress)
+
+
+def run_ingest_pipeline(
+    paths,
+    db,
+    split_documents,
+    calculate_chunk_ids,
+    workers=LOAD_WORKERS,
+    batch_size=INGEST_BATCH_SIZE,
+    concurrency=EMBED_CONCURRENCY,
+    lexical_index=None,
+    progress=None,
+):
+    """Stream PDFs through load -> split -> embed -> upsert and return the chunk IDs per source
+
+    progress, if given, gets plan(paths) once and then add(pages=, chunks=, embeddings=) as work completes.
+    """
+    print(f"Ingesting {len(paths)} file(s)")
+    if progress is not None:
+        progress.plan(paths)
+    pages = iter_pdf_pages(paths, workers=workers)
+    batches = _background(_chunk_batches(pages, split_documents, calculate_chunk_ids, batch_size, progress))
+    embedded = _background(_embed_batches(batches, db.embeddings, concurrency))
+    return _upsert_embedded(db, embedded, lexical_index, progress)
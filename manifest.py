@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+MANIFEST_PATH = os.environ.get("MANIFEST_PATH", "data/manifest.json")
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+PDF_GLOB = "**/[!.]*.pdf"
+
+
+@dataclass
+class ManifestDiff:
+    changed: list[str] = field(default_factory=list)  # New or modified files to (re)ingest.
+    removed: list[str] = field(default_factory=list)  # Files that are gone from disk.
+    stale_ids: list[str] = field(default_factory=list)  # Chunk IDs to delete before re-ingesting.
+    pending: dict = field(default_factory=dict)  # Fresh entries for changed files.
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    if not os.path.exists(manifest_path):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        print(f"⚠️ Ignoring manifest {manifest_path} with unknown version {manifest.get('version')}")
+        return {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    # Write to a temp file first so a crash mid-write never leaves a truncated manifest.
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def clear_manifest(manifest_path=MANIFEST_PATH):
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+
+def diff_source_dir(manifest, source_dir):
+    """Compare the files under source_dir with the manifest and work out what to ingest"""
+    files = manifest["files"]
+    diff = ManifestDiff()
+    seen = set()
+
+    for path in sorted(Path(source_dir).glob(PDF_GLOB)):
+        if not path.is_file():
+            continue
+        # Same key as the "source" metadata PyPDFDirectoryLoader puts on every page.
+        source = str(path)
+        seen.add(source)
+        stat = path.stat()
+        entry = files.get(source)
+
+        # Cheap check first: unchanged size and mtime means we never read the file.
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            continue
+
+        sha256 = file_sha256(path)
+        if entry and entry["sha256"] == sha256:
+            # Touched but not modified, just refresh the stat fields.
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+            continue
+
+        if entry:
+            diff.stale_ids.extend(entry.get("chunk_ids", []))
+        diff.changed.append(source)
+        diff.pending[source] = {
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunk_ids": [],
+        }
+
+    for source in sorted(set(files) - seen):
+        diff.removed.append(source)
+        diff.stale_ids.extend(files[source].get("chunk_ids", []))
+
+    return diff
+
+
+def apply_diff(manifest, diff, chunk_ids):
+    """Record the chunk IDs produced for each changed file and drop removed files"""
+    for source, ids in chunk_ids.items():
+        if source in diff.pending:
+            diff.pending[source]["chunk_ids"].extend(ids)
+
+    files = manifest["files"]
+    for source in diff.removed:
+        files.pop(source, None)
+    files.update(diff.pending)
+    return manifest
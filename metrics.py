@@ -0,0 +1,62 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+
+# Up to a minute, a cold model load or a long answer easily takes tens of seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent in each query and ingestion stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+QUERY_SECONDS = Histogram(
+    "rag_query_seconds", "End to end time of a query", ["mode", "cache"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_seconds", "Time to handle an API request", ["path", "status"], buckets=LATENCY_BUCKETS
+)
+PROMPT_TOKENS = Counter("rag_prompt_tokens", "Prompt tokens sent to the chat model")
+COMPLETION_TOKENS = Counter("rag_completion_tokens", "Completion tokens generated by the chat model")
+COMPLETION_TOKENS_PER_SECOND = Histogram(
+    "rag_completion_tokens_per_second", "Generation speed of each answer",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500),
+)
+INGEST_PAGES = Counter("rag_ingest_pages", "PDF pages loaded and split")
+INGEST_CHUNKS = Counter("rag_ingest_chunks", "Chunks produced by splitting")
+INGEST_EMBEDDINGS = Counter("rag_ingest_embeddings", "Chunks embedded and written to the store")
+INGEST_RUNNING = Gauge("rag_ingest_running", "Ingestion runs in progress", multiprocess_mode="livesum")
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def record_generation(message, seconds):
+    """Count the tokens of a ChatOllama answer and its generation speed"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    metadata = getattr(message, "response_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens") or metadata.get("prompt_eval_count") or 0
+    completion_tokens = usage.get("output_tokens") or metadata.get("eval_count") or 0
+    PROMPT_TOKENS.inc(prompt_tokens)
+    COMPLETION_TOKENS.inc(completion_tokens)
+    # Ollama reports the pure generation time; fall back to the wall time of the call.
+    eval_seconds = (metadata.get("eval_duration") or 0) / 1e9 or seconds
+    if completion_tokens and eval_seconds > 0:
+        COMPLETION_TOKENS_PER_SECOND.observe(completion_tokens / eval_seconds)
+
+
+def render_metrics():
+    """Prometheus text format; sums over all uvicorn workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,105 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from langchain_community.document_loaders import PyPDFLoader
+# Private helpers of PyPDFParser.lazy_parse, so a page range is built exactly like a whole file is.
+from langchain_community.document_loaders.parsers.pdf import _merge_text_and_extras, _purge_metadata, _validate_metadata
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from manifest import PDF_GLOB
+
+# 0 or 1 keeps the original single-process loading.
+LOAD_WORKERS = int(os.environ.get("LOAD_WORKERS", "0"))
+# Files with more pages than this are split into page ranges across workers.
+PAGES_PER_TASK = int(os.environ.get("PAGES_PER_TASK", "64"))
+
+
+def list_pdf_files(source_dir):
+    return [str(path) for path in sorted(Path(source_dir).glob(PDF_GLOB)) if path.is_file()]
+
+
+def _load_file(path):
+    pages = PyPDFLoader(path).load()
+    for page in pages:
+        page.metadata["source"] = path
+    return pages
+
+
+def _load_page_range(path, start, stop):
+    # What PyPDFLoader(path).load()[start:stop] returns, text and metadata alike, without
+    # extracting the other pages: a page's chunks, IDs and embedding cache keys must not
+    # depend on whether its file was split or on the worker count.
+    parser = PyPDFLoader(path).parser
+    reader = PdfReader(path, password=parser.password)
+    metadata = _purge_metadata(
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | dict(reader.metadata or {})
+        | {"source": path, "total_pages": len(reader.pages)}
+    )
+    page_labels = reader.page_labels
+    documents = []
+    for page_number in range(start, stop):
+        page = reader.pages[page_number]
+        text = page.extract_text(extraction_mode=parser.extraction_mode, **parser.extraction_kwargs)
+        documents.append(Document(
+            page_content=_merge_text_and_extras([parser.extract_images_from_page(page)], text).strip(),
+            metadata=_validate_metadata(metadata | {"page": page_number, "page_label": page_labels[page_number]}),
+        ))
+    return documents
+
+
+def _run_task(task):
+    path, start, stop = task
+    if start is None:
+        return _load_file(path)
+    return _load_page_range(path, start, stop)
+
+
+def count_pages(path):
+    try:
+        return len(PdfReader(path).pages)
+    except Exception as e:
+        # Let the loader raise the real error for this file.
+        print(f"⚠️ Could not count pages of {path}: {e}")
+        return 0
+
+
+def _plan_tasks(paths, pages_per_task, pool):
+    # Pages are counted in the workers, all files at once, instead of one after the other here.
+    for path, page_count in zip(paths, pool.map(count_pages, paths)):
+
+        if page_count <= pages_per_task:
+            yield (path, None, None)
+            continue
+        for start in range(0, page_count, pages_per_task):
+            yield (path, start, min(start + pages_per_task, page_count))
+
+
+def iter_pdf_pages(paths, workers=LOAD_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """Yield the pages of each PDF in order, holding only a few tasks' worth in memory"""
+    if workers <= 1:
+        for path in paths:
+            for page in PyPDFLoader(path).lazy_load():
+                page.metadata["source"] = path
+                yield page
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Results are consumed in submission order, whatever order the tasks finish in.
+        # Capping the in-flight tasks keeps parsed pages from piling up ahead of the consumer.
+        pending = deque()
+        for task in _plan_tasks(paths, pages_per_task, pool):
+            pending.append(pool.submit(_run_task, task))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def load_pdfs_parallel(paths, workers=LOAD_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """Load PDFs across a process pool, keeping file and page order"""
+    print(f"Loading {len(paths)} PDF(s) on {workers} worker(s)")
+    return list(iter_pdf_pages(paths, workers=workers, pages_per_task=pages_per_task))
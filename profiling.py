@@ -0,0 +1,156 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Off unless switched on, then a request opts in with the header or is picked by the sample rate.
+PROFILE_ENABLED = os.environ.get("PROFILE_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = "X-Profile"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "data/profiles")
+# Oldest profiles are deleted beyond this many files.
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+# "sample" snapshots every thread's stack, so work in to_thread and the ingest worker shows up.
+# "cprofile" traces every call, but only in the thread that started it, with much more overhead.
+PROFILE_MODES = ("sample", "cprofile")
+# X-Request-ID ends up in a file name, anything else gets a generated id.
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Only one cProfile can be active per process.
+_CPROFILE_LOCK = threading.Lock()
+
+
+def choose_mode(header_value):
+    """Profile mode for a request, or None to run it unprofiled"""
+    if not PROFILE_ENABLED:
+        return None
+    if header_value:
+        return header_value if header_value in PROFILE_MODES else "sample"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def request_id_from(header_value):
+    """The client's X-Request-ID when it is safe to use in a file name, else a new one"""
+    if header_value and REQUEST_ID_PATTERN.match(header_value):
+        return header_value
+    return uuid.uuid4().hex
+
+
+class SamplingProfiler:
+    """Counts the stacks of all threads every interval, written out in collapsed (flame graph) format"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, path):
+        # stop() only signals the sampler, waiting for its last sample happens here, off the event loop.
+        self._thread.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class DeterministicProfiler:
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        _CPROFILE_LOCK.release()
+
+    def save(self, path):
+        self._profile.dump_stats(path)
+
+
+def profile_path(mode, request_id, label):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    extension = "folded" if mode == "sample" else "prof"
+    return os.path.join(PROFILE_DIR, f"{timestamp}_{label}_{request_id}.{extension}")
+
+
+def _rotate():
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)),
+        key=os.path.getmtime,
+    )
+    for path in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        os.remove(path)
+
+
+def start_profile(mode):
+    """Start a profiler; returns (mode actually used, profiler)"""
+    if mode == "cprofile" and _CPROFILE_LOCK.acquire(blocking=False):
+        profiler = DeterministicProfiler()
+    else:
+        # Another request holds cProfile, sampling still works alongside it.
+        mode, profiler = "sample", SamplingProfiler()
+    profiler.start()
+    return mode, profiler
+
+
+def finish_profile(profiler, path):
+    profiler.stop()
+    write_profile(profiler, path)
+
+
+def write_profile(profiler, path):
+    """Save a stopped profiler; blocking, async callers run it in a thread"""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.save(path)
+        _rotate()
+        print(f"Profile written to {path}")
+    except OSError as e:
+        # A full disk must not fail the request that was profiled.
+        print(f"⚠️ Could not write profile {path}: {e}")
+
+
+@contextmanager
+def profiled(mode, request_id, label):
+    """Profile the block when mode is set, otherwise do nothing"""
+    if mode is None:
+        yield
+        return
+    mode, profiler = start_profile(mode)
+    try:
+        yield
+    finally:
+        finish_profile(profiler, profile_path(mode, request_id, label))
@@ -0,0 +1,52 @@
+import numpy as np
+
+# "float32" keeps no compact copy and searches the full-precision matrix directly.
+QUANTIZATIONS = ("float32", "float16", "int8", "binary")
+# Rows converted to float32 at a time while scoring, bounds the temporary memory per query.
+SCORE_BLOCK_ROWS = 2048
+
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def encode(kind, vectors):
+    """Return (codes, scales) for unit vectors; scales is None unless kind is int8"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if kind == "float16":
+        return vectors.astype(np.float16), None
+    if kind == "int8":
+        # One scale per row, so each vector uses the whole int8 range.
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if kind == "binary":
+        # Sign bits only, compared with Hamming distance.
+        return np.packbits(vectors > 0, axis=1), None
+    raise ValueError(f"Unknown quantization {kind!r}, expected one of {QUANTIZATIONS}")
+
+
+def approximate_scores(kind, codes, scales, query):
+    """Similarity of the query to every row of codes, higher is closer"""
+    query = np.asarray(query, dtype=np.float32)
+    scores = np.empty(len(codes), dtype=np.float32)
+
+    if kind == "binary":
+        query_bits = np.packbits(query > 0)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            distances = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1, dtype=np.int32)
+            scores[start:start + len(block)] = -distances
+        return scores
+
+    for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+        block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+        block_scores = block @ query
+        if scales is not None:
+            block_scores *= scales[start:start + len(block)]
+        scores[start:start + len(block)] = block_scores
+    return scores
+
+
+def code_shape(kind, dim):
+    if kind == "binary":
+        return ((dim + 7) // 8,), np.uint8
+    return (dim,), {"float16": np.float16, "int8": np.int8}[kind]
@@ -1,10 +1,35 @@
-from langchain.prompts import ChatPromptTemplate
+# First, so the image runtime's background store copy overlaps the imports below.
+from src.chromadb import PREWARM_COLLECTIONS, SNAPSHOT_PATH, get_chroma_db, get_collection_handles, get_runtime_chroma_path, startup_phase
+from src.collection_paths import DEFAULT_COLLECTION, resolve_collection, store_file_name
+from langchain_core.prompts import ChatPromptTemplate
 #from langchain.chat_models import ollama
 #from langchain_ollama import ChatOllama
-from langchain_ollama import ChatOllama
+# langchain_ollama and src.embeddings are imported on first use, so their import time shows up in
+# the start-up report (open_store's import_embeddings, warm_up_chat) and overlaps the store copy.
 from typing import List
-from src.chromadb import get_chroma_db
-from dataclasses import dataclass
+from src.answer_cache import AnswerCache, read_collection_version
+from src.query_batcher import QUERY_BATCH_MAX_SIZE, QueryEmbeddingBatcher
+from src.bm25_index import BM25_INDEX_FILENAME, BM25Index, reciprocal_rank_fusion
+from src.context_packer import pack_context
+# Top-level like api_handler and ingestion import it, so each metric is registered once per process.
+from metrics import QUERY_SECONDS, record_generation, stage_timer
+from langchain_core.documents import Document
+from dataclasses import dataclass, replace
+import asyncio
+import os
+import time
+
+CHAT_MODEL = "qwen2.5:0.5b"
+# Chunks retrieved per query; the context packer fits as many as the token budget allows.
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "3"))
+# "vector" or "hybrid" (vector + BM25 fused with reciprocal rank fusion).
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "vector")
+# Candidates taken from each side before fusing down to the final top RETRIEVAL_K.
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "10"))
+# How long Ollama keeps the chat model loaded after the last request.
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+CHAT_MODEL_INSTANCE = None  # Reference to singleton instance of ChatOllama
+QUERY_BATCHER_INSTANCE = None  # Reference to singleton instance of QueryEmbeddingBatcher
 
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context:
@@ -16,24 +41,87 @@ Answer the question based only on the following context:
 Answer the question based on the above context: {question}
 """
 
+PROMPT_TEMPLATE_INSTANCE = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
 @dataclass
 class QueryResponse:
     query_text : str
     response_text : str
     sources : List[str]
 
-def query_rag(query_text : str) -> QueryResponse:
-    db = get_chroma_db()
+def get_chat_model():
+    #One client for the whole process, so its HTTP connections are kept alive and reused
+    global CHAT_MODEL_INSTANCE
+    if not CHAT_MODEL_INSTANCE:
+        from langchain_ollama import ChatOllama
+        CHAT_MODEL_INSTANCE = ChatOllama(model=CHAT_MODEL, keep_alive=OLLAMA_KEEP_ALIVE)
+    return CHAT_MODEL_INSTANCE
 
-    #Database search
-    results= db.similarity_search_with_score(query_text,k=3)
-    context="\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    prompt_template= ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context,question=query_text)
-
-    model= ChatOllama(model="qwen2.5:0.5b")
-    response=model.invoke(prompt)
-    response_text = response.content
+def get_query_batcher():
+    global QUERY_BATCHER_INSTANCE
+    if not QUERY_BATCHER_INSTANCE:
+        from src.embeddings import get_query_embedding_function
+        QUERY_BATCHER_INSTANCE = QueryEmbeddingBatcher(get_query_embedding_function())
+    return QUERY_BATCHER_INSTANCE
+
+def open_bm25_index(collection, path):
+    if SNAPSHOT_PATH:
+        #The snapshot's own BM25 section, raises for snapshots exported without one
+        return get_chroma_db(collection).bm25_index()
+    index = BM25Index(path)
+    if not index.doc_terms:
+        #Fusing with an empty ranking silently degrades hybrid retrieval to vector-only
+        print(f"⚠️ BM25 index of collection {collection} is empty, run create_db.py --rebuild-bm25 for stores built without it")
+    return index
+
+def get_bm25_index(collection=None):
+    #Held next to the collection's store in the LRU of open collections, and evicted with it
+    collection = resolve_collection(collection)
+    path = os.path.join(get_runtime_chroma_path(), store_file_name(BM25_INDEX_FILENAME, collection))
+    index = get_collection_handles().get(collection, "bm25", lambda: open_bm25_index(collection, path))
+    #Pick up whatever ingestion has written since the last query
+    index.refresh()
+    return index
+
+def get_answer_cache(collection=None):
+    #One cache per collection, so the same question asked of two corpora gets two answers
+    collection = resolve_collection(collection)
+    return get_collection_handles().get(collection, "answers", lambda: AnswerCache(collection=collection))
+
+async def warm_up():
+    """Open the hot collections and load both Ollama models before the first user request"""
+    db = None
+    for collection in PREWARM_COLLECTIONS or [DEFAULT_COLLECTION]:
+        try:
+            with startup_phase(f"prewarm:{collection}"):
+                db = get_chroma_db(collection)
+                if RETRIEVAL_MODE == "hybrid":
+                    get_bm25_index(collection)
+        except Exception as e:
+            # Opened on its first query instead.
+            print(f"⚠️ Could not prewarm collection {collection}: {e}")
+    try:
+        with startup_phase("warm_up_embedding"):
+            if db is not None:
+                await aembed_query(db, "warm up")
+            else:
+                from src.embeddings import get_query_embedding_function
+                await get_query_embedding_function().aembed_query("warm up")
+        with startup_phase("warm_up_chat"):
+            await get_chat_model().ainvoke("Reply with OK.")
+        print(f"✅ Warmed up {CHAT_MODEL} and the embedding model")
+    except Exception as e:
+        # The API still starts; the first request just pays the model load instead.
+        print(f"⚠️ Warm-up failed: {e}")
+
+def format_prompt(query_text : str, results) -> str:
+    #Merges neighbouring chunks, drops repeated overlap and near-duplicates, fills the token budget
+    with stage_timer("pack_context"):
+        context=pack_context(results)
+    return PROMPT_TEMPLATE_INSTANCE.format(context=context,question=query_text)
+
+
+def build_response(query_text : str, response_text : str, results) -> QueryResponse:
     sources = [doc.metadata.get("id", None) for doc, _score in results]
     print(f"Response: {response_text}\nSources: {sources}")
     return QueryResponse(
@@ -41,6 +129,160 @@ def query_rag(query_text : str) -> QueryResponse:
     )
 
 
+def refresh_store(db):
+    #The flat backend reloads whatever ingestion has saved since the last query
+    if hasattr(db, "refresh"):
+        db.refresh()
+
+
+def fuse_hybrid(db, query_text : str, vector_results, collection=None):
+    with stage_timer("bm25_search"):
+        lexical_results = get_bm25_index(collection).search(query_text, k=HYBRID_CANDIDATES)
+    fused = reciprocal_rank_fusion([
+        [doc.metadata.get("id", None) for doc, _score in vector_results],
+        [chunk_id for chunk_id, _score in lexical_results],
+    ])[:RETRIEVAL_K]
+
+    #Lexical-only hits still need their text and metadata from the store
+    docs = {doc.metadata.get("id", None): doc for doc, _score in vector_results}
+    missing = [chunk_id for chunk_id, _score in fused if chunk_id not in docs]
+    if missing:
+        found = db.get(ids=missing, include=["documents", "metadatas"])
+        for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+            docs[chunk_id] = Document(page_content=text, metadata=metadata)
+    return [(docs[chunk_id], score) for chunk_id, score in fused if chunk_id in docs]
+
+
+def retrieve(db, query_text : str, query_embedding=None, collection=None):
+    refresh_store(db)
+    k = max(HYBRID_CANDIDATES, RETRIEVAL_K) if RETRIEVAL_MODE == "hybrid" else RETRIEVAL_K
+    #Reuse the query embedding when the answer cache already computed it
+    if query_embedding is None:
+        #Embedded here rather than inside the search, so the two are timed apart
+        with stage_timer("embed_query"):
+            query_embedding = db.embeddings.embed_query(query_text)
+    with stage_timer("vector_search"):
+        results= db.similarity_search_by_vector_with_relevance_scores(query_embedding,k=k)
+    if RETRIEVAL_MODE == "hybrid":
+        results= fuse_hybrid(db, query_text, results, collection)
+    return results
+
+
+async def aembed_query(db, query_text : str):
+    #Concurrent queries share one batched embedding request
+    with stage_timer("embed_query"):
+        if QUERY_BATCH_MAX_SIZE > 1:
+            return await get_query_batcher().aembed_query(query_text)
+        return await db.embeddings.aembed_query(query_text)
+
+
+async def alookup(db, cache, query_text : str):
+    #Exact hits skip the embedding call altogether
+    cached = cache.peek(query_text)
+    if cached:
+        return cached, None
+    query_embedding = None
+    if cache.semantic or QUERY_BATCH_MAX_SIZE > 1:
+        query_embedding = await aembed_query(db, query_text)
+    return cache.get(query_text, query_embedding), query_embedding
+
+
+async def aretrieve(db, query_text : str, query_embedding=None, collection=None):
+    #Off the event loop, since the Chroma client itself is synchronous
+    return await asyncio.to_thread(retrieve, db, query_text, query_embedding, collection)
+
+
+def query_rag(query_text : str, collection : str = None) -> QueryResponse:
+    start = time.perf_counter()
+    db = get_chroma_db(collection)
+    cache = get_answer_cache(collection)
+    version = read_collection_version(collection)
+    query_embedding = None
+    if cache.semantic:
+        with stage_timer("embed_query"):
+            query_embedding = db.embeddings.embed_query(query_text)
+    cached = cache.get(query_text, query_embedding)
+    if cached:
+        QUERY_SECONDS.labels("sync", "hit").observe(time.perf_counter() - start)
+        return replace(cached, query_text=query_text)
+
+    #Database search
+    results= retrieve(db, query_text, query_embedding, collection)
+    prompt = format_prompt(query_text, results)
+
+    model= get_chat_model()
+    llm_start = time.perf_counter()
+    with stage_timer("llm"):
+        response=model.invoke(prompt)
+    record_generation(response, time.perf_counter() - llm_start)
+    query_response = build_response(query_text, response.content, results)
+    cache.put(query_text, query_response, query_embedding, version)
+    QUERY_SECONDS.labels("sync", "miss").observe(time.perf_counter() - start)
+    return query_response
+
+
+async def aquery_rag(query_text : str, collection : str = None) -> QueryResponse:
+    start = time.perf_counter()
+    db = get_chroma_db(collection)
+    cache = get_answer_cache(collection)
+    version = read_collection_version(collection)
+    cached, query_embedding = await alookup(db, cache, query_text)
+    if cached:
+        QUERY_SECONDS.labels("async", "hit").observe(time.perf_counter() - start)
+        return replace(cached, query_text=query_text)
+
+    #Database search
+    results= await aretrieve(db, query_text, query_embedding, collection)
+    prompt = format_prompt(query_text, results)
+
+    #ainvoke waits on the Ollama HTTP call without holding a thread
+    model= get_chat_model()
+    llm_start = time.perf_counter()
+    with stage_timer("llm"):
+        response= await model.ainvoke(prompt)
+    record_generation(response, time.perf_counter() - llm_start)
+    query_response = build_response(query_text, response.content, results)
+    cache.put(query_text, query_response, query_embedding, version)
+    QUERY_SECONDS.labels("async", "miss").observe(time.perf_counter() - start)
+    return query_response
+
+
+async def astream_query_rag(query_text : str, collection : str = None):
+    """Yield the retrieved sources first, then the answer tokens as the model generates them"""
+    start = time.perf_counter()
+    db = get_chroma_db(collection)
+    cache = get_answer_cache(collection)
+    version = read_collection_version(collection)
+    cached, query_embedding = await alookup(db, cache, query_text)
+    if cached:
+        yield {"type": "sources", "sources": cached.sources}
+        yield {"type": "token", "text": cached.response_text}
+        yield {"type": "done"}
+        QUERY_SECONDS.labels("stream", "hit").observe(time.perf_counter() - start)
+        return
+
+    results= await aretrieve(db, query_text, query_embedding, collection)
+    sources = [doc.metadata.get("id", None) for doc, _score in results]
+    yield {"type": "sources", "sources": sources}
+
+    prompt = format_prompt(query_text, results)
+    model= get_chat_model()
+    response_text = ""
+    #The last chunk carries the token counts
+    last_chunk = None
+    llm_start = time.perf_counter()
+    with stage_timer("llm"):
+        async for chunk in model.astream(prompt):
+            last_chunk = chunk
+            if chunk.content:
+                response_text += chunk.content
+                yield {"type": "token", "text": chunk.content}
+    record_generation(last_chunk, time.perf_counter() - llm_start)
+    cache.put(query_text, QueryResponse(query_text=query_text, response_text=response_text, sources=sources), query_embedding, version)
+    yield {"type": "done"}
+    QUERY_SECONDS.labels("stream", "miss").observe(time.perf_counter() - start)
+
+
 
 if __name__ == "__main__":
     query_rag("How can I contact support?")
@@ -0,0 +1,382 @@
+"""Single-file snapshots of the vector store, for shipping an index to serving nodes.
+
+    python snapshot.py export --output data/index.snap
+    python snapshot.py verify data/index.snap
+    python snapshot.py import data/index.snap
+    python snapshot.py export --collection tenant-a --output data/snapshots/tenant-a.snap
+
+Layout: a fixed HEADER_SIZE block holding the magic, then a JSON header with
+the format version, row count, dimension, embedding model and client version,
+section offsets and a SHA-256 of everything after the header. Then come the 64-byte aligned sections:
+
+    vectors            float32 (count, dim), unit rows
+    ids_offsets        uint64 (count + 1), ids         UTF-8 bytes
+    texts_offsets      uint64 (count + 1), texts       UTF-8 bytes
+    metadatas_offsets  uint64 (count + 1), metadatas   one JSON object per row
+    manifest           the collection's ingest manifest as JSON, optional
+    bm25               the BM25 index's {chunk id: {term: frequency}} as JSON, optional
+
+Nothing is parsed on load: the file is memory-mapped and every section is a
+view into it, so opening takes the same time whatever the index size.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_core.documents import Document
+
+from bm25_index import BM25Index
+
+SNAPSHOT_MAGIC = b"RAGSNAP\x00"
+SNAPSHOT_VERSION = 1
+HEADER_SIZE = 4096
+SECTION_ALIGNMENT = 64
+EXPORT_BATCH_SIZE = 1000
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+STRING_SECTIONS = ("ids", "texts", "metadatas")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _SectionWriter:
+    """Appends rows to a temp file, keeping the offsets for string sections"""
+
+    def __init__(self, directory, name):
+        self.path = os.path.join(directory, name)
+        self.file = open(self.path, "wb")
+        self.offsets = [0]
+
+    def write(self, data):
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self.file.close()
+
+
+def _iter_rows(db, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (ids, embeddings, documents, metadatas) batches from a flat or Chroma store"""
+    if hasattr(db, "upsert_embeddings"):
+        count = len(db.ids)
+        for start in range(0, count, batch_size):
+            stop = min(start + batch_size, count)
+            yield db.ids[start:stop], db._matrix[start:stop], db.documents[start:stop], db.metadatas[start:stop]
+        return
+    collection = db._collection
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        yield batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"]
+
+
+def write_snapshot(rows, output_path, embedding_model=None, manifest=None, bm25=None, embedding_client_version=None):
+    """Write batches of (ids, embeddings, documents, metadatas) to one snapshot file; returns the header"""
+    workdir = tempfile.mkdtemp(prefix=".snapshot-", dir=os.path.dirname(os.path.abspath(output_path)))
+    tmp_path = f"{output_path}.tmp"
+    try:
+        sections = {name: _SectionWriter(workdir, name) for name in ("vectors",) + STRING_SECTIONS}
+        count, dim = 0, None
+        for ids, embeddings, documents, metadatas in rows:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if not len(vectors):
+                continue
+            if dim is None:
+                dim = vectors.shape[1]
+            # Stored as unit rows, so search is a plain dot product.
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            sections["vectors"].file.write((vectors / np.where(norms == 0, 1, norms)).tobytes())
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                sections["ids"].write(chunk_id.encode("utf-8"))
+                sections["texts"].write((document or "").encode("utf-8"))
+                sections["metadatas"].write(json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8"))
+            count += len(vectors)
+        for section in sections.values():
+            section.close()
+
+        # Offsets arrays go right before the bytes they index.
+        parts = [("vectors", sections["vectors"].path, "float32", [count, dim or 0])]
+        for name in STRING_SECTIONS:
+            offsets_path = os.path.join(workdir, f"{name}.offsets")
+            np.asarray(sections[name].offsets, dtype=np.uint64).tofile(offsets_path)
+            parts.append((f"{name}_offsets", offsets_path, "uint64", [count + 1]))
+            parts.append((name, sections[name].path, "uint8", None))
+        for name, value in (("manifest", manifest), ("bm25", bm25)):
+            if value is not None:
+                value_path = os.path.join(workdir, name)
+                with open(value_path, "w", encoding="utf-8") as f:
+                    json.dump(value, f, ensure_ascii=False)
+                parts.append((name, value_path, "uint8", None))
+
+        header = {
+            "format": "rag-snapshot",
+            "version": SNAPSHOT_VERSION,
+            "count": count,
+            "dim": dim,
+            "embedding_model": embedding_model,
+            "embedding_client_version": embedding_client_version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "sections": {},
+        }
+        digest = hashlib.sha256()
+        with open(tmp_path, "wb") as out:
+            out.write(b"\x00" * HEADER_SIZE)
+            for name, path, dtype, shape in parts:
+                padding = -out.tell() % SECTION_ALIGNMENT
+                out.write(b"\x00" * padding)
+                digest.update(b"\x00" * padding)
+                offset = out.tell()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                        out.write(block)
+                        digest.update(block)
+                length = out.tell() - offset
+                header["sections"][name] = {"offset": offset, "length": length, "dtype": dtype, "shape": shape or [length]}
+            header["sha256"] = digest.hexdigest()
+
+            encoded = json.dumps(header).encode("utf-8")
+            if len(SNAPSHOT_MAGIC) + 4 + len(encoded) > HEADER_SIZE:
+                raise SnapshotError(f"Snapshot header of {len(encoded)} bytes does not fit in {HEADER_SIZE}")
+            out.seek(0)
+            out.write(SNAPSHOT_MAGIC + struct.pack("<I", len(encoded)) + encoded)
+        os.replace(tmp_path, output_path)
+        return header
+    finally:
+        # Only left behind when writing failed.
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        block = f.read(HEADER_SIZE)
+    if block[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise SnapshotError(f"{path} is not a snapshot file")
+    (length,) = struct.unpack("<I", block[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 4])
+    header = json.loads(block[len(SNAPSHOT_MAGIC) + 4:len(SNAPSHOT_MAGIC) + 4 + length])
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"{path} has snapshot version {header.get('version')}, expected {SNAPSHOT_VERSION}")
+    return header
+
+
+def verify_snapshot(path):
+    """Check the SHA-256 of the file body against the header; reads the whole file"""
+    header = read_header(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    if digest.hexdigest() != header["sha256"]:
+        raise SnapshotError(f"{path} is corrupt: checksum mismatch")
+    return header
+
+
+class SnapshotStore:
+    """Read-only vector store served straight from a memory-mapped snapshot file
+
+    Implements the parts of the langchain Chroma API that query_rag uses, like FlatVectorStore.
+    With embedding_model or embedding_client_version given, a snapshot embedded by another
+    model or client version is refused on open; a query vector of the wrong dimension is
+    refused on search.
+    """
+
+    def __init__(self, path, embedding_function=None, verify=False, embedding_model=None, embedding_client_version=None):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.header = verify_snapshot(path) if verify else read_header(path)
+        self.dim = self.header["dim"]
+        for field, expected in (("embedding_model", embedding_model), ("embedding_client_version", embedding_client_version)):
+            # Older snapshots lack the field, those are trusted.
+            found = self.header.get(field)
+            if expected and found and found != expected:
+                raise SnapshotError(f"{path} was embedded with {field} {found}, queries are embedded with {expected}")
+        self._mmap = np.memmap(path, dtype=np.uint8, mode="r")
+        self._sections = {name: self._section(name) for name in self.header["sections"]}
+        self.vectors = self._sections["vectors"]
+        self._positions = None
+        self._lock = threading.Lock()
+
+    def _section(self, name):
+        section = self.header["sections"][name]
+        raw = self._mmap[section["offset"]:section["offset"] + section["length"]]
+        return raw.view(np.dtype(section["dtype"])).reshape(section["shape"])
+
+    def _string(self, name, row):
+        offsets = self._sections[f"{name}_offsets"]
+        return bytes(self._sections[name][int(offsets[row]):int(offsets[row + 1])]).decode("utf-8")
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return self.header["count"]
+
+    def __bool__(self):
+        # An empty store is still a valid singleton instance.
+        return True
+
+    def refresh(self):
+        # A snapshot never changes in place; a new index is deployed as a new file.
+        pass
+
+    def id(self, row):
+        return self._string("ids", row)
+
+    def text(self, row):
+        return self._string("texts", row)
+
+    def metadata(self, row):
+        return json.loads(self._string("metadatas", row))
+
+    def manifest(self):
+        """The ingest manifest exported with the snapshot, None for snapshots written without one"""
+        if "manifest" not in self._sections:
+            return None
+        return json.loads(bytes(self._sections["manifest"]).decode("utf-8"))
+
+    def bm25_index(self):
+        """The BM25 index exported with the snapshot, so hybrid retrieval ranks exactly its chunks"""
+        if "bm25" not in self._sections:
+            raise SnapshotError(f"{self.path} has no BM25 section, re-export it with snapshot.py or serve it with RETRIEVAL_MODE=vector")
+        return BM25Index.from_doc_terms(json.loads(bytes(self._sections["bm25"]).decode("utf-8")))
+
+    def document(self, row):
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        with self._lock:
+            if self._positions is None:
+                # Only built when something asks for rows by ID (hybrid retrieval).
+                self._positions = {self.id(row): row for row in range(len(self))}
+        rows = range(len(self)) if ids is None else [self._positions[i] for i in ids if i in self._positions]
+        result = {"ids": [self.id(row) for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self.text(row) for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadata(row) for row in rows]
+        return result
+
+    def search_by_vector(self, embedding, k=3):
+        """Return (row, cosine distance) pairs of the k nearest rows"""
+        count = len(self)
+        if not count:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        if query.shape != (self.dim,):
+            raise SnapshotError(f"Query vector has {query.size} dims, {self.path} has {self.dim}")
+        query /= np.linalg.norm(query) or 1.0
+        k = min(k, count)
+        scores = self.vectors @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(1.0 - scores[row])) for row in top]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=3):
+        return [(self.document(row), distance) for row, distance in self.search_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=3):
+        return self.similarity_search_by_vector_with_relevance_scores(self.embedding_function.embed_query(query), k)
+
+    async def asimilarity_search_with_score(self, query, k=3):
+        return await asyncio.to_thread(self.similarity_search_with_score, query, k)
+
+
+def export_snapshot(output_path, collection=None):
+    from collection_paths import collection_path, resolve_collection
+    from create_db import get_ingest_db, get_lexical_index, write_lock
+    from embeddings import EMBEDDING_CLIENT_VERSION, EMBEDDING_MODEL
+    from manifest import MANIFEST_PATH, load_manifest
+
+    collection = resolve_collection(collection)
+    # Held so the rows, the BM25 index and the manifest all come from the same ingest run.
+    with write_lock(collection):
+        manifest = load_manifest(collection_path(collection, MANIFEST_PATH, "manifest.json"))
+        lexical_index = get_lexical_index(collection)
+        header = write_snapshot(
+            _iter_rows(get_ingest_db(collection)), output_path, embedding_model=EMBEDDING_MODEL,
+            manifest=manifest, bm25=lexical_index.doc_terms, embedding_client_version=EMBEDDING_CLIENT_VERSION,
+        )
+    if header["count"] and not lexical_index.doc_terms:
+        print(f"⚠️ BM25 index of collection {collection} is empty, run create_db.py --rebuild-bm25 and export again for hybrid retrieval")
+    size_mb = os.path.getsize(output_path) / 1024**2
+    print(f"✅ Exported {header['count']} chunks ({header['dim']} dims) to {output_path}, {size_mb:.1f}MB")
+
+
+def import_snapshot(path, verify=True, batch_size=EXPORT_BATCH_SIZE, collection=None):
+    """Replace a collection of the local store with the contents of a snapshot
+
+    The exported manifest is imported with it, so the next create_db.py run only re-embeds
+    files that differ from what the snapshot was built from. Snapshots written without one
+    leave the collection without a manifest: fine for serving-only nodes, but ingesting into
+    it later re-embeds every source file and never removes chunks of files that are gone.
+    The web crawl cache is not carried over, the next crawl re-embeds every URL.
+    """
+    from answer_cache import bump_collection_version
+    from collection_paths import collection_path, resolve_collection
+    from create_db import clear_database, get_ingest_db, get_lexical_index, save_indexes, write_lock
+    from embeddings import EMBEDDING_CLIENT_VERSION, EMBEDDING_MODEL
+    from ingest_pipeline import upsert_chunks
+    from manifest import MANIFEST_PATH, save_manifest
+
+    collection = resolve_collection(collection)
+    store = SnapshotStore(
+        path, verify=verify, embedding_model=EMBEDDING_MODEL, embedding_client_version=EMBEDDING_CLIENT_VERSION
+    )
+    with write_lock(collection):
+        print(f"✨ Clearing Database before importing {len(store)} chunks from {path}")
+        clear_database(collection)
+        db = get_ingest_db(collection)
+        lexical_index = get_lexical_index(collection)
+        for start in range(0, len(store), batch_size):
+            rows = range(start, min(start + batch_size, len(store)))
+            batch = [store.document(row) for row in rows]
+            for row, chunk in zip(rows, batch):
+                chunk.metadata.setdefault("id", store.id(row))
+            upsert_chunks(db, batch, store.vectors[start:rows.stop].tolist())
+            lexical_index.add([chunk.metadata["id"] for chunk in batch], [chunk.page_content for chunk in batch])
+        save_indexes(collection)
+        manifest = store.manifest()
+        if manifest is not None:
+            save_manifest(manifest, collection_path(collection, MANIFEST_PATH, "manifest.json"))
+        else:
+            print(f"⚠️ {path} has no manifest, import it only on serving nodes that never ingest")
+        bump_collection_version(collection)
+    print(f"✅ Imported {len(store)} chunks")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write the local store to a snapshot file.")
+    export_parser.add_argument("--output", default="data/index.snap")
+    export_parser.add_argument("--collection", help="Collection to export, the default one if not given.")
+    import_parser = commands.add_parser("import", help="Replace the local store with a snapshot.")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--no-verify", action="store_true", help="Skip the checksum check.")
+    import_parser.add_argument("--collection", help="Collection to replace, the default one if not given.")
+    verify_parser = commands.add_parser("verify", help="Check a snapshot's checksum.")
+    verify_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.output, args.collection)
+    elif args.command == "import":
+        import_snapshot(args.path, verify=not args.no_verify, collection=args.collection)
+    else:
+        header = verify_snapshot(args.path)
+        print(f"✅ {args.path}: {header['count']} chunks, {header['dim']} dims, checksum OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Appended, not prepended: the repo's own chromadb.py must not shadow the chromadb package.
+# "python -m pytest" from the repo root puts it first, so it is moved to the end.
+sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != REPO_ROOT]
+sys.path.append(REPO_ROOT)
+
+# The query side imports its siblings as src.*, the way they are laid out in the image.
+if "src" not in sys.modules:
+    package = types.ModuleType("src")
+    package.__path__ = [REPO_ROOT]
+    sys.modules["src"] = package
+
+
+class _Page:
+    """What the test web server answers: a body and its ETag, both changeable between requests"""
+
+    def __init__(self):
+        self.body = b"<html lang='en'><head><title>Menu</title></head><body>Soup of the day</body></html>"
+        self.etag = '"v1"'
+        self.requests = []  # Request headers, one dict per GET
+
+
+@pytest.fixture
+def web_page():
+    page = _Page()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            page.requests.append(dict(self.headers))
+            if self.headers.get("If-None-Match") == page.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", page.etag)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(page.body)))
+            self.end_headers()
+            self.wfile.write(page.body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    page.url = f"http://127.0.0.1:{server.server_address[1]}/menu"
+    yield page
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,39 @@
+import pytest
+
+import answer_cache
+import collection_paths
+from answer_cache import AnswerCache, bump_collection_version
+
+
+@pytest.fixture(autouse=True)
+def version_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache, "COLLECTION_VERSION_PATH", str(tmp_path / "collection_version"))
+    monkeypatch.setattr(collection_paths, "COLLECTIONS_DIR", str(tmp_path / "collections"))
+
+
+def test_normalized_question_hits():
+    cache = AnswerCache()
+    cache.put("What are the opening hours?", "nine to five")
+    assert cache.get("  what are the OPENING hours ") == "nine to five"
+    assert cache.stats()["hits"] == 1
+
+
+def test_ingestion_only_invalidates_its_own_collection():
+    default, tenant = AnswerCache(), AnswerCache(collection="tenant-a")
+    default.put("question", "default answer")
+    tenant.put("question", "tenant answer")
+
+    bump_collection_version("tenant-a")
+    assert default.get("question") == "default answer"
+    assert tenant.get("question") is None
+
+    bump_collection_version()
+    assert default.get("question") is None
+
+
+def test_answer_computed_before_a_change_is_not_stored():
+    cache = AnswerCache(collection="tenant-a")
+    version = answer_cache.read_collection_version("tenant-a")
+    bump_collection_version("tenant-a")
+    cache.put("question", "stale answer", version=version)
+    assert cache.get("question") is None
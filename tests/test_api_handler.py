@@ -0,0 +1,56 @@
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import profiling
+from api_handler import ProfileMiddleware, app
+
+
+def make_client():
+    test_app = FastAPI()
+    test_app.add_middleware(ProfileMiddleware)
+
+    @test_app.post("/submit_query_stream")
+    def stream(request: Request):
+        state = {"request_id": request.state.request_id, "profile_mode": request.state.profile_mode}
+        return StreamingResponse(iter([b"a\n", f"{state}\n".encode()]), media_type="application/x-ndjson")
+
+    @test_app.get("/health")
+    def health():
+        return {"ok": True}
+
+    return TestClient(test_app)
+
+
+def test_profiling_middleware_is_not_installed_when_disabled():
+    assert not profiling.PROFILE_ENABLED
+    assert ProfileMiddleware not in [middleware.cls for middleware in app.user_middleware]
+
+
+def test_sampled_request_is_profiled_until_its_stream_ends(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    client = make_client()
+
+    response = client.post("/submit_query_stream", headers={"X-Profile": "sample", "X-Request-ID": "req-1"})
+    assert response.text.startswith("a\n")
+    assert "'request_id': 'req-1', 'profile_mode': 'sample'" in response.text
+    assert response.headers["X-Request-ID"] == "req-1"
+    assert response.headers["X-Profile-Mode"] == "sample"
+    assert "X-Profile-Path" not in response.headers
+    (profile,) = os.listdir(tmp_path)
+    assert profile.endswith("_submit_query_stream_req-1.folded")
+
+
+def test_unsafe_request_id_and_other_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    client = make_client()
+
+    response = client.post("/submit_query_stream", headers={"X-Profile": "sample", "X-Request-ID": "../../x"})
+    assert response.headers["X-Request-ID"] != "../../x"
+    response = client.get("/health", headers={"X-Profile": "sample"})
+    assert "X-Profile-Mode" not in response.headers
+    assert len(os.listdir(tmp_path)) == 1
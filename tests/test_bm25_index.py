@@ -0,0 +1,84 @@
+import threading
+import time
+
+import bm25_index
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_compound_tokens_are_kept_with_their_parts():
+    assert tokenize("Error E-1042 on v2.3") == ["error", "e-1042", "e", "1042", "on", "v2.3", "v2", "3"]
+
+
+def test_search_ranks_exact_terms_and_follows_updates(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.pkl"))
+    index.add(["a", "b", "c"], [
+        "Error E-1042 means the printer is out of paper.",
+        "The printer supports double sided printing.",
+        "Opening hours are nine to five.",
+    ])
+    assert index.search("E-1042", k=2)[0][0] == "a"
+    # Same term frequency, the shorter chunk ranks first.
+    assert [chunk_id for chunk_id, _ in index.search("printer", k=5)] == ["b", "a"]
+
+    index.remove(["a"])
+    assert index.search("E-1042") == []
+    index.add(["b"], ["Now about opening hours instead."])
+    assert index.search("printer") == []
+
+
+def test_saved_index_is_loaded_by_a_reader(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    writer = BM25Index(path)
+    reader = BM25Index(path)
+    writer.add(["a"], ["refund policy"])
+    writer.save()
+    reader.refresh()
+    assert reader.search("refund")[0][0] == "a"
+
+
+
+def test_concurrent_refreshes_load_a_saved_index_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "bm25.pkl")
+    reader = BM25Index(path)
+    writer = BM25Index(path)
+    writer.add(["a", "b"], ["refund policy", "opening hours"])
+    writer.save()
+
+    loads = []
+    original_load = bm25_index.pickle.load
+
+    def counting_load(f):
+        loads.append(f.name)
+        time.sleep(0.01)
+        return original_load(f)
+
+    monkeypatch.setattr(bm25_index.pickle, "load", counting_load)
+    threads = [threading.Thread(target=reader.refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert reader.search("hours")[0][0] == "b"
+
+
+def test_memory_bytes_follows_the_indexed_pairs(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    index = BM25Index(path)
+    assert index.memory_bytes() == 0
+    index.add(["a", "b"], ["refund refund policy", "policy"])
+    assert index.pair_count == 3
+    size = index.memory_bytes()
+    assert size > 0
+    index.save()
+    reader = BM25Index(path)
+    assert reader.memory_bytes() == size
+    index.add(["a"], ["refund"])
+    index.remove(["b"])
+    assert index.pair_count == 1
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == ["a", "c", "b", "d"]
+    assert fused[0][1] == 1 / 61 + 1 / 62
@@ -0,0 +1,24 @@
+import os
+
+import numpy as np
+from langchain_ollama import OllamaEmbeddings
+
+from flat_index import FLAT_INDEX_DIRNAME, FlatVectorStore
+from src import chromadb
+
+
+def test_serving_handles_skip_the_document_embedding_cache(tmp_path, monkeypatch):
+    store_path = tmp_path / "store"
+    writer = FlatVectorStore(str(store_path / FLAT_INDEX_DIRNAME))
+    writer.upsert_embeddings(["a"], np.ones((1, 4), dtype=np.float32), ["A"], [{"id": "a"}])
+    writer.save()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(chromadb, "CHROMA_PATH", str(store_path))
+    monkeypatch.setattr(chromadb, "VECTOR_BACKEND", "flat")
+    monkeypatch.setattr(chromadb, "SNAPSHOT_PATH", None)
+
+    db = chromadb.open_store(chromadb.DEFAULT_COLLECTION)
+    assert type(db.embedding_function) is OllamaEmbeddings
+    assert db.read_only
+    # The cache's SQLite file lives under data/ relative to the working directory.
+    assert not os.path.exists(tmp_path / "data")
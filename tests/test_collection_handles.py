@@ -0,0 +1,49 @@
+from collection_handles import CollectionHandles
+
+
+class Resource:
+    def __init__(self, size=0):
+        self.size = size
+
+    def memory_bytes(self):
+        return self.size
+
+
+def test_least_recently_used_collection_is_closed_first():
+    handles = CollectionHandles(max_open=2, max_bytes=0)
+    first = handles.get("aaa", "db", Resource)
+    handles.get("bbb", "db", Resource)
+    # Using aaa again makes bbb the least recently used.
+    assert handles.get("aaa", "db", Resource) is first
+    handles.get("ccc", "db", Resource)
+    stats = handles.stats()
+    assert list(stats["open"]) == ["ccc", "aaa"]
+    assert (stats["opened"], stats["evictions"]) == (3, 1)
+
+
+def test_resources_of_a_collection_are_evicted_together():
+    handles = CollectionHandles(max_open=1, max_bytes=0)
+    handles.get("aaa", "db", Resource)
+    handles.get("aaa", "bm25", Resource)
+    handles.get("bbb", "db", Resource)
+    reopened = handles.get("aaa", "bm25", Resource)
+    assert list(handles.stats()["open"]) == ["aaa"]
+    assert handles.opened == 3
+    assert handles.get("aaa", "bm25", Resource) is reopened
+
+
+def test_memory_bound_counts_every_resource_and_keeps_the_one_in_use():
+    mb = 1024 * 1024
+    handles = CollectionHandles(max_open=8, max_bytes=3 * mb)
+    handles.get("aaa", "db", lambda: Resource(mb))
+    handles.get("aaa", "bm25", lambda: Resource(mb))
+    handles.get("bbb", "db", lambda: Resource(mb))
+    assert list(handles.stats()["open"]) == ["bbb", "aaa"]
+
+    # The BM25 index pushes the total over 3MB, so aaa goes.
+    handles.get("bbb", "bm25", lambda: Resource(mb))
+    assert handles.stats()["open"] == {"bbb": 2.0}
+
+    # Alone over the bound, but in use: kept open.
+    handles.get("ccc", "db", lambda: Resource(4 * mb))
+    assert handles.stats()["open"] == {"ccc": 4.0}
@@ -0,0 +1,56 @@
+from langchain_core.documents import Document
+
+from context_packer import CONTEXT_SEPARATOR, _merge_neighbours, pack_context, strip_overlap
+
+
+def result(chunk_id, text, score=0.1):
+    return Document(page_content=text, metadata={"id": chunk_id}), score
+
+
+def test_short_coincidental_match_is_not_overlap():
+    assert strip_overlap("Call the support line", "energy costs rose sharply") == "energy costs rose sharply"
+    assert strip_overlap("Total: 10", "0 items were shipped") == "0 items were shipped"
+
+
+def test_splitter_overlap_is_stripped():
+    shared = "the refund is issued within five working days"
+    previous = f"Returns are accepted for thirty days and {shared}"
+    text = f"{shared} of the item arriving back at the warehouse."
+    assert strip_overlap(previous, text) == " of the item arriving back at the warehouse."
+
+
+def test_match_that_cuts_a_word_is_not_overlap():
+    previous = "a long sentence that happens to end in understand"
+    text = "understanding of the sentence that happens to end in"
+    assert strip_overlap(previous, "sentence that happens to end in understanding") == \
+        "sentence that happens to end in understanding"
+    assert strip_overlap(previous, text) == text
+
+
+def test_neighbours_without_overlap_are_joined_on_a_new_line():
+    merged = _merge_neighbours([
+        result("doc.pdf:0:0", "First paragraph ends here."),
+        result("doc.pdf:0:1", "Second paragraph starts here."),
+    ])
+    assert merged == ["First paragraph ends here.\nSecond paragraph starts here."]
+
+
+def test_neighbours_with_overlap_keep_the_shared_text_once():
+    merged = _merge_neighbours([
+        result("doc.pdf:0:1", "keeps going until the overlap region ends. Tail."),
+        result("doc.pdf:0:0", "Opening words, then the text keeps going until the overlap region ends."),
+    ])
+    assert merged == ["Opening words, then the text keeps going until the overlap region ends. Tail."]
+
+
+def test_near_duplicates_are_dropped_and_budget_respected():
+    text = "Store hours are nine to five on weekdays and ten to four on Saturdays."
+    context = pack_context([
+        result("a.pdf:0:0", text),
+        result("b.pdf:3:0", text + " Closed on Sundays."),
+        result("c.pdf:1:0", "Parking is free for customers in the lot behind the store."),
+    ], token_budget=1000)
+    assert context.split(CONTEXT_SEPARATOR) == [
+        text, "Parking is free for customers in the lot behind the store."
+    ]
+    assert len(pack_context([result("a.pdf:0:0", text * 20)], token_budget=10)) <= 40
@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+import create_db
+from bm25_index import BM25Index
+from collection_handles import CollectionHandles
+from embeddings import EMBEDDING_CLIENT_VERSION
+from flat_index import FlatVectorStore
+from snapshot import SnapshotStore, export_snapshot
+from web_fetcher import fetch_urls, load_web_cache, save_web_cache
+
+
+@pytest.fixture
+def flat_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_db, "CHROMA_PATH", str(tmp_path))
+    monkeypatch.setattr(create_db, "VECTOR_BACKEND", "flat")
+    monkeypatch.setattr(create_db, "get_embedding_function", lambda: None)
+    monkeypatch.setattr(create_db, "INGEST_HANDLES", CollectionHandles())
+    return tmp_path
+
+
+def ingest(chunk_id, seed):
+    vector = np.random.default_rng(seed).normal(size=(1, 8)).astype(np.float32)
+    create_db.get_ingest_db().upsert_embeddings([chunk_id], vector, [chunk_id], [{"id": chunk_id}])
+    create_db.get_lexical_index().add([chunk_id], [f"term{seed}"])
+    create_db.save_indexes()
+
+
+def test_run_picks_up_what_another_process_saved(flat_store):
+    with create_db.write_lock():
+        ingest("worker-1", 1)
+
+    # Another process (the create_db CLI) writes the same collection with its own handles.
+    other_db = FlatVectorStore(os.path.join(flat_store, create_db.FLAT_INDEX_DIRNAME))
+    other_bm25 = BM25Index(os.path.join(flat_store, create_db.BM25_INDEX_FILENAME))
+    other_db.upsert_embeddings(["cli-1"], np.ones((1, 8), dtype=np.float32), ["cli-1"], [{"id": "cli-1"}])
+    other_bm25.add(["cli-1"], ["cliterm"])
+    other_db.save()
+    other_bm25.save()
+
+    with create_db.write_lock():
+        ingest("worker-2", 2)
+
+    reader = FlatVectorStore(os.path.join(flat_store, create_db.FLAT_INDEX_DIRNAME), read_only=True)
+    assert sorted(reader.ids) == ["cli-1", "worker-1", "worker-2"]
+    bm25 = BM25Index(os.path.join(flat_store, create_db.BM25_INDEX_FILENAME))
+    assert sorted(bm25.doc_terms) == ["cli-1", "worker-1", "worker-2"]
+
+
+def test_failed_run_drops_its_unsaved_changes(flat_store):
+    with pytest.raises(RuntimeError):
+        with create_db.write_lock():
+            create_db.get_lexical_index().add(["lost"], ["never saved"])
+            raise RuntimeError("embedding server down")
+
+    with create_db.write_lock():
+        ingest("kept", 1)
+    bm25 = BM25Index(os.path.join(flat_store, create_db.BM25_INDEX_FILENAME))
+    assert list(bm25.doc_terms) == ["kept"]
+
+
+def test_nested_runs_take_the_lock_once(flat_store):
+    with create_db.write_lock():
+        with create_db.write_lock():
+            ingest("a", 1)
+        ingest("b", 2)
+    assert create_db.WRITE_LOCK_DEPTHS[create_db.resolve_collection()] == 0
+
+
+def test_ingestion_handles_are_bounded(flat_store, monkeypatch):
+    monkeypatch.setattr(create_db, "INGEST_HANDLES", CollectionHandles(max_open=1, max_bytes=0))
+    for collection in ("tenant-a", "tenant-b"):
+        with create_db.write_lock(collection):
+            create_db.get_lexical_index(collection).add(["a"], ["refund"])
+            create_db.save_indexes(collection)
+    assert list(create_db.INGEST_HANDLES.stats()["open"]) == ["tenant-b"]
+
+
+def test_crawl_keeps_rotated_validators_of_unchanged_pages(flat_store, web_page, monkeypatch):
+    cache_path = str(flat_store / "web_cache.json")
+    monkeypatch.setattr(create_db, "WEB_CACHE_PATH", cache_path)
+    first = asyncio.run(fetch_urls([web_page.url], {"urls": {}}))[0]
+    save_web_cache({"version": 1, "urls": {web_page.url: {**first.validators, "chunk_ids": ["page:None:0"]}}}, cache_path)
+
+    # Same body under a new ETag: nothing to embed, but the new ETag is kept.
+    web_page.etag = '"v2"'
+    (result,) = create_db.update_web([web_page.url])
+    assert result.status == "unchanged"
+    entry = load_web_cache(cache_path)["urls"][web_page.url]
+    assert entry["etag"] == '"v2"'
+    assert entry["chunk_ids"] == ["page:None:0"]
+
+    # So the next crawl gets a 304 instead of the whole page.
+    create_db.update_web([web_page.url])
+    assert web_page.requests[-1]["If-None-Match"] == '"v2"'
+
+
+
+def test_export_ships_the_bm25_index_and_client_version(flat_store, monkeypatch):
+    monkeypatch.chdir(flat_store)
+    with create_db.write_lock():
+        ingest("a", 1)
+    path = str(flat_store / "index.snap")
+    export_snapshot(path)
+
+    store = SnapshotStore(path, verify=True)
+    assert store.header["embedding_client_version"] == EMBEDDING_CLIENT_VERSION
+    assert store.bm25_index().doc_terms == {"a": {"term1": 1}}
@@ -0,0 +1,44 @@
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[len(text) * self.scale, 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [len(text) * self.scale, 1.0]
+
+
+def test_repeated_texts_are_served_from_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = CachedEmbeddings(CountingEmbeddings(), "model", "v1", path=path)
+    assert first.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert first.embeddings.calls == 2
+
+    second = CachedEmbeddings(CountingEmbeddings(), "model", "v1", path=path)
+    assert second.embed_documents(["bb"]) == [[2.0, 1.0]]
+    assert second.embeddings.calls == 0
+    assert second.stats()["size_bytes"] == 2 * 2 * 4
+
+
+def test_a_new_client_version_does_not_see_old_vectors(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    CachedEmbeddings(CountingEmbeddings(), "model", "v1", path=path).embed_documents(["abc"])
+    upgraded = CachedEmbeddings(CountingEmbeddings(scale=0.5), "model", "v2", path=path)
+    assert upgraded.embed_documents(["abc"]) == [[1.5, 1.0]]
+    assert upgraded.embeddings.calls == 1
+    # The old version's rows were dropped, only the new vector is counted.
+    assert upgraded.stats()["size_bytes"] == 2 * 4
+
+
+def test_replacing_a_row_does_not_grow_the_size(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), "model", "v1", path=str(tmp_path / "cache.sqlite3"))
+    with cache._lock:
+        cache._store({"key": [1.0, 2.0]})
+        cache._store({"key": [3.0, 4.0]})
+    assert cache.stats()["size_bytes"] == 2 * 4
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import flat_index
+from flat_index import FlatVectorStore
+
+
+def unit_vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(path, ids, vectors, quantization=None):
+    writer = FlatVectorStore(str(path), quantization=quantization)
+    writer.upsert_embeddings(ids, vectors, [chunk_id.upper() for chunk_id in ids], [{"id": chunk_id} for chunk_id in ids])
+    writer.save()
+    return writer
+
+
+def top_id(store, vector):
+    (document, _distance), = store.similarity_search_by_vector_with_relevance_scores(vector, k=1)
+    return document.metadata["id"]
+
+
+def test_unsaved_delete_does_not_change_what_readers_see(tmp_path):
+    ids = ["a", "b", "c", "d"]
+    vectors = unit_vectors(4)
+    writer = build(tmp_path, ids, vectors)
+    reader = FlatVectorStore(str(tmp_path), read_only=True)
+
+    # Moves "d" into the row of "a" in the writer, readers must keep the published rows.
+    writer.delete(["a"])
+    reader.refresh()
+    assert top_id(reader, vectors[3]) == "d"
+    assert top_id(reader, vectors[0]) == "a"
+
+    writer.save()
+    reader.refresh()
+    assert len(reader) == 3
+    assert top_id(reader, vectors[3]) == "d"
+    assert reader.get(ids=["d"])["documents"] == ["D"]
+    assert reader.get(ids=["a"])["ids"] == []
+
+
+def test_appends_are_published_in_place(tmp_path):
+    vectors = unit_vectors(5)
+    writer = build(tmp_path, ["a", "b"], vectors[:2])
+    reader = FlatVectorStore(str(tmp_path), read_only=True)
+    for row, chunk_id in enumerate(["c", "d", "e"], start=2):
+        writer.upsert_embeddings([chunk_id], vectors[row:row + 1], [chunk_id], [{"id": chunk_id}])
+        writer.save()
+        # No copy of the rows already published, the new ones go after them.
+        assert writer.generation == 1
+        reader.refresh()
+        assert len(reader) == row + 1
+        assert top_id(reader, vectors[row]) == chunk_id
+    assert [path.name for path in tmp_path.iterdir() if path.is_dir()] == ["generation-1"]
+
+    # A new writer appends to what it loaded.
+    writer = FlatVectorStore(str(tmp_path))
+    writer.upsert_embeddings(["f"], unit_vectors(1, seed=1), ["f"], [{"id": "f"}])
+    writer.save()
+    assert writer.generation == 1
+    reader.refresh()
+    assert len(reader) == 6
+
+
+def test_rewrites_publish_a_new_generation_and_remove_old_ones(tmp_path):
+    vectors = unit_vectors(6)
+    ids = ["a", "b", "c", "d", "e", "f"]
+    writer = build(tmp_path, ids, vectors)
+    for generation, chunk_id in enumerate(["a", "b", "c"], start=2):
+        writer.delete([chunk_id])
+        writer.save()
+        assert writer.generation == generation
+    directories = sorted(path.name for path in tmp_path.iterdir() if path.is_dir())
+    assert directories == ["generation-3", "generation-4"]
+
+    # Replacing a published row forks too.
+    writer.upsert_embeddings(["d"], vectors[:1], ["D2"], [{"id": "d"}])
+    writer.save()
+    assert writer.generation == 5
+
+    reader = FlatVectorStore(str(tmp_path), read_only=True)
+    assert reader.generation == 5
+    assert reader.get(ids=["d"])["documents"] == ["D2"]
+    assert top_id(reader, vectors[5]) == "f"
+
+
+def test_read_only_store_refuses_changes(tmp_path):
+    build(tmp_path, ["a"], unit_vectors(1))
+    reader = FlatVectorStore(str(tmp_path), read_only=True)
+    with pytest.raises(PermissionError):
+        reader.upsert_embeddings(["b"], unit_vectors(1), ["b"], [{"id": "b"}])
+    with pytest.raises(PermissionError):
+        reader.delete(["a"])
+    with pytest.raises(PermissionError):
+        reader.save()
+    assert len(reader) == 1
+
+
+def test_concurrent_refreshes_load_a_new_version_once(tmp_path, monkeypatch):
+    vectors = unit_vectors(3)
+    writer = build(tmp_path, ["a", "b"], vectors[:2])
+    reader = FlatVectorStore(str(tmp_path), read_only=True)
+    writer.upsert_embeddings(["c"], vectors[2:], ["c"], [{"id": "c"}])
+    writer.save()
+
+    loads = []
+    original_load = flat_index.pickle.load
+
+    def counting_load(f):
+        loads.append(f.name)
+        time.sleep(0.01)
+        return original_load(f)
+
+    monkeypatch.setattr(flat_index.pickle, "load", counting_load)
+    threads = [threading.Thread(target=reader.refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(reader) == 3
+
+
+def test_save_without_changes_keeps_the_generation(tmp_path):
+    writer = build(tmp_path, ["a"], unit_vectors(1))
+    writer.save()
+    assert writer.generation == 1
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8", "binary"])
+def test_quantized_search_round_trips_through_save(tmp_path, quantization):
+    ids = [f"chunk-{i}" for i in range(50)]
+    vectors = unit_vectors(50, dim=32, seed=1)
+    build(tmp_path, ids, vectors, quantization=quantization)
+    reader = FlatVectorStore(str(tmp_path), read_only=True)
+    assert reader.quantization == quantization
+    for row in (0, 17, 49):
+        assert top_id(reader, vectors[row]) == ids[row]
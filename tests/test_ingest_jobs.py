@@ -0,0 +1,57 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from ingest_jobs import IngestJobQueue
+
+
+def wait_done(queue, job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.get(job.job_id).status not in ("done", "failed"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return queue.get(job.job_id).to_dict()
+
+
+def test_pdf_and_web_jobs_share_one_writer():
+    running, overlaps, calls = [], [], []
+    lock = threading.Lock()
+
+    def exclusive(name):
+        with lock:
+            overlaps.append(bool(running))
+            running.append(name)
+        time.sleep(0.02)
+        with lock:
+            running.remove(name)
+        calls.append(name)
+
+    def ingest(progress, collection):
+        exclusive(("pdf", collection))
+
+    def ingest_web(urls, collection, progress):
+        exclusive(("web", collection))
+        progress.add(pages=len(urls))
+        return [SimpleNamespace(url=url, status="changed", error=None) for url in urls]
+
+    queue = IngestJobQueue(ingest, ingest_web)
+    pdf_job = queue.submit(["a.pdf"], collection="tenant-a")
+    web_job = queue.submit_web(["https://example.com/"], collection="tenant-a")
+
+    assert wait_done(queue, pdf_job)["status"] == "done"
+    web = wait_done(queue, web_job)
+    assert web["status"] == "done"
+    assert web["total_pages"] == web["pages_done"] == 1
+    assert web["results"] == [{"url": "https://example.com/", "status": "changed", "error": None}]
+    assert calls == [("pdf", "tenant-a"), ("web", "tenant-a")]
+    assert not any(overlaps)
+
+
+def test_failed_job_reports_its_error():
+    def ingest(progress, collection):
+        raise RuntimeError("embedding server down")
+
+    queue = IngestJobQueue(ingest)
+    job = wait_done(queue, queue.submit(["a.pdf"]))
+    assert job["status"] == "failed"
+    assert job["error"] == "embedding server down"
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from ingest_pipeline import _background, _embed_batches, _embed_with_retry
+
+
+class FlakyEmbeddings:
+    """Fails the first `failures` calls, then returns one [len(text)] vector per text"""
+
+    def __init__(self, failures=0, max_delay=0.0):
+        self.failures = failures
+        self.max_delay = max_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise ConnectionError("Ollama is restarting")
+        if self.max_delay:
+            time.sleep(random.uniform(0, self.max_delay))
+        return [[float(len(text))] for text in texts]
+
+
+def chunks(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_failed_batch_is_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr("ingest_pipeline.time.sleep", delays.append)
+    embeddings = FlakyEmbeddings(failures=2)
+    assert _embed_with_retry(embeddings, chunks("a", "bb"), max_retries=3, backoff=0.5) == [[1.0], [2.0]]
+    assert embeddings.calls == 3
+    assert delays == [0.5, 1.0]
+
+
+def test_batch_fails_once_retries_are_used_up(monkeypatch):
+    monkeypatch.setattr("ingest_pipeline.time.sleep", lambda delay: None)
+    embeddings = FlakyEmbeddings(failures=3)
+    with pytest.raises(ConnectionError):
+        _embed_with_retry(embeddings, chunks("a"), max_retries=2)
+    assert embeddings.calls == 3
+
+
+def test_concurrent_batches_come_back_in_order():
+    batches = [chunks("x" * (index + 1)) for index in range(20)]
+    embedded = list(_embed_batches(iter(batches), FlakyEmbeddings(max_delay=0.01), concurrency=4))
+    assert [batch for batch, _vectors in embedded] == batches
+    assert [vectors for _batch, vectors in embedded] == [[[float(index + 1)]] for index in range(20)]
+
+
+def test_producer_blocks_while_the_queue_is_full():
+    produced = []
+
+    def pages():
+        for page in range(100):
+            produced.append(page)
+            yield page
+
+    items = _background(pages(), maxsize=2)
+    assert next(items) == 0
+    # Two pages wait in the queue and a third in the blocked put, the rest are never produced.
+    assert wait_for(lambda: len(produced) == 4)
+    time.sleep(0.2)
+    assert len(produced) == 4
+    assert list(items) == list(range(1, 100))
+
+
+def test_producer_stops_once_the_consumer_is_gone():
+    closed = threading.Event()
+
+    def pages():
+        try:
+            yield from range(100)
+        finally:
+            closed.set()
+
+    items = _background(pages(), maxsize=2)
+    assert next(items) == 0
+    items.close()
+    assert closed.wait(timeout=5)
+
+
+def test_producer_error_reaches_the_consumer():
+    def pages():
+        yield 0
+        raise ValueError("broken PDF")
+
+    items = _background(pages())
+    assert next(items) == 0
+    with pytest.raises(ValueError, match="broken PDF"):
+        next(items)
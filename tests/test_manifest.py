@@ -0,0 +1,53 @@
+import os
+
+from manifest import apply_diff, diff_source_dir, load_manifest, save_manifest
+
+
+def ingest(source_dir, manifest_path):
+    # What update_chroma records once the files are embedded: one chunk per file, named after it.
+    manifest = load_manifest(manifest_path)
+    diff = diff_source_dir(manifest, source_dir)
+    chunk_ids = {source: [f"{source}:0:0"] for source in diff.changed}
+    save_manifest(apply_diff(manifest, diff, chunk_ids), manifest_path)
+    return diff
+
+
+def test_diff_follows_added_changed_deleted_and_renamed_files(tmp_path):
+    source_dir, manifest_path = tmp_path / "source", str(tmp_path / "manifest.json")
+    source_dir.mkdir()
+    for name in ("a", "b", "c", "d"):
+        (source_dir / f"{name}.pdf").write_bytes(f"%PDF-1.4 {name}".encode())
+    paths = {name: str(source_dir / f"{name}.pdf") for name in ("a", "b", "c", "d", "e", "renamed")}
+    diff = ingest(str(source_dir), manifest_path)
+    assert diff.changed == [paths["a"], paths["b"], paths["c"], paths["d"]]
+    assert (diff.removed, diff.stale_ids) == ([], [])
+
+    (source_dir / "a.pdf").write_bytes(b"%PDF-1.4 a, second edition")
+    (source_dir / "b.pdf").unlink()
+    (source_dir / "c.pdf").rename(source_dir / "renamed.pdf")
+    (source_dir / "e.pdf").write_bytes(b"%PDF-1.4 e")
+    diff = ingest(str(source_dir), manifest_path)
+    assert diff.changed == [paths["a"], paths["e"], paths["renamed"]]
+    assert diff.removed == [paths["b"], paths["c"]]
+    # A renamed file is the old one removed plus a new one added, its chunk IDs hold the path.
+    assert diff.stale_ids == [f"{paths['a']}:0:0", f"{paths['b']}:0:0", f"{paths['c']}:0:0"]
+    files = load_manifest(manifest_path)["files"]
+    assert sorted(files) == [paths["a"], paths["d"], paths["e"], paths["renamed"]]
+    assert files[paths["renamed"]]["chunk_ids"] == [f"{paths['renamed']}:0:0"]
+
+
+def test_touched_file_is_not_ingested_again(tmp_path):
+    source_dir, manifest_path = tmp_path / "source", str(tmp_path / "manifest.json")
+    source_dir.mkdir()
+    path = source_dir / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 a")
+    ingest(str(source_dir), manifest_path)
+
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    diff = ingest(str(source_dir), manifest_path)
+    assert (diff.changed, diff.removed, diff.stale_ids) == ([], [], [])
+    # The new mtime is recorded, so the next run skips the file without hashing it.
+    entry = load_manifest(manifest_path)["files"][str(path)]
+    assert entry["mtime_ns"] == stat.st_mtime_ns + 10**9
+    assert entry["chunk_ids"] == [f"{path}:0:0"]
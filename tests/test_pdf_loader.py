@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+from langchain_community.document_loaders import PyPDFLoader
+
+from pdf_loader import iter_pdf_pages, list_pdf_files
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from bench_pipeline import write_pdf  # noqa: E402
+
+
+@pytest.fixture
+def pdf_paths(tmp_path):
+    for name, page_count in (("small.pdf", 2), ("large.pdf", 11), ("medium.pdf", 5)):
+        write_pdf(tmp_path / name, [[f"{name} page {page} line {line}" for line in range(3)] for page in range(page_count)])
+    return list_pdf_files(tmp_path)
+
+
+@pytest.mark.parametrize("workers, pages_per_task", [(2, 3), (3, 4), (2, 64)])
+def test_pages_match_pypdfloader_whatever_the_worker_count(pdf_paths, workers, pages_per_task):
+    expected = []
+    for path in pdf_paths:
+        expected.extend(PyPDFLoader(path).load())
+    pages = list(iter_pdf_pages(pdf_paths, workers=workers, pages_per_task=pages_per_task))
+    assert pages == expected
+    assert pages == list(iter_pdf_pages(pdf_paths, workers=0))
+    assert pages[-1].metadata["total_pages"] == 2
+    assert not pages[0].page_content.endswith("\n")
@@ -0,0 +1,28 @@
+import os
+
+import profiling
+from profiling import SamplingProfiler, profile_path, request_id_from, write_profile
+
+
+def test_request_id_from_keeps_safe_ids():
+    assert request_id_from("req-42_a") == "req-42_a"
+    assert request_id_from("a" * 64) == "a" * 64
+
+
+def test_request_id_from_replaces_unsafe_ids():
+    for value in (None, "", "../../etc/passwd", "a b", "a" * 65, "id\r\nX-Evil: 1"):
+        request_id = request_id_from(value)
+        assert request_id != value
+        assert profiling.REQUEST_ID_PATTERN.match(request_id)
+
+
+def test_sampling_profile_is_written_after_stop(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    profiler.stop()
+    path = profile_path("sample", request_id_from("req-1"), "submit_query")
+    write_profile(profiler, path)
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.exists(path)
+    assert not profiler._thread.is_alive()
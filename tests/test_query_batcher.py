@@ -0,0 +1,39 @@
+import asyncio
+import gc
+
+from query_batcher import QueryEmbeddingBatcher
+
+
+class SlowEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        # Collecting here must not drop the in-flight batch.
+        gc.collect()
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_queries_share_one_batch():
+    async def run():
+        embeddings = SlowEmbeddings()
+        batcher = QueryEmbeddingBatcher(embeddings, max_batch_size=8, max_wait_ms=5)
+        vectors = await asyncio.gather(*(batcher.aembed_query("x" * n) for n in range(1, 5)))
+        return embeddings, batcher, vectors
+
+    embeddings, batcher, vectors = asyncio.run(run())
+    assert vectors == [[1.0], [2.0], [3.0], [4.0]]
+    assert len(embeddings.calls) == 1
+    assert batcher.stats()["mean_batch_size"] == 4
+    assert not batcher._tasks
+
+
+def test_full_batch_is_sent_without_waiting():
+    async def run():
+        embeddings = SlowEmbeddings()
+        batcher = QueryEmbeddingBatcher(embeddings, max_batch_size=2, max_wait_ms=10_000)
+        return await asyncio.wait_for(asyncio.gather(batcher.aembed_query("a"), batcher.aembed_query("bb")), 1)
+
+    assert asyncio.run(run()) == [[1.0], [2.0]]
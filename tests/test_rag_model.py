@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import rag_model
+from collection_handles import CollectionHandles
+from snapshot import SnapshotError, SnapshotStore, write_snapshot
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_importing_rag_model_defers_the_ollama_clients():
+    # A fresh interpreter, other tests may already have imported them.
+    code = (
+        "import sys, conftest, rag_model; "
+        "print(sorted(m for m in ('langchain_ollama', 'embeddings', 'src.embeddings') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=TESTS_DIR, capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize("bm25", [{"a": {"soup": 1}}, None])
+def test_snapshot_serves_its_own_bm25_section(tmp_path, monkeypatch, bm25):
+    path = str(tmp_path / "index.snap")
+    write_snapshot([(["a"], np.ones((1, 4), dtype=np.float32), ["Soup"], [{"id": "a"}])], path, bm25=bm25)
+    store, handles = SnapshotStore(path), CollectionHandles()
+    monkeypatch.setattr(rag_model, "SNAPSHOT_PATH", path)
+    monkeypatch.setattr(rag_model, "get_chroma_db", lambda collection: store)
+    monkeypatch.setattr(rag_model, "get_collection_handles", lambda: handles)
+
+    if bm25 is None:
+        # Not an empty index that would quietly turn hybrid retrieval into vector-only.
+        with pytest.raises(SnapshotError, match="no BM25 section"):
+            rag_model.get_bm25_index()
+    else:
+        assert [chunk_id for chunk_id, _score in rag_model.get_bm25_index().search("soup")] == ["a"]
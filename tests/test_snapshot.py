@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from snapshot import SnapshotError, SnapshotStore, verify_snapshot, write_snapshot
+
+BM25 = {"a:3:0": {"soup": 2, "day": 1}, "a:4:0": {"bread": 1}}
+MANIFEST = {"version": 1, "files": {"data/source/a.pdf": {"sha256": "00", "size": 1, "mtime_ns": 1, "chunk_ids": ["a:0:0"]}}}
+
+
+def rows(count=5, dim=8, batch_size=2):
+    vectors = np.random.default_rng(0).normal(size=(count, dim)).astype(np.float32)
+    ids = [f"a:{row}:0" for row in range(count)]
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        yield (
+            ids[start:stop], vectors[start:stop], [f"text {row} é" for row in range(start, stop)],
+            [{"source": "data/source/a.pdf", "page": row} for row in range(start, stop)],
+        )
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "index.snap")
+    header = write_snapshot(rows(), path, embedding_model="model-a", manifest=MANIFEST)
+    assert (header["count"], header["dim"]) == (5, 8)
+    assert verify_snapshot(path)["sha256"] == header["sha256"]
+
+    store = SnapshotStore(path, verify=True, embedding_model="model-a")
+    vectors = np.vstack([batch[1] for batch in rows()])
+    assert len(store) == 5
+    assert np.allclose(np.linalg.norm(store.vectors, axis=1), 1.0)
+    (document, distance), = store.similarity_search_by_vector_with_relevance_scores(vectors[3], k=1)
+    assert document.page_content == "text 3 é"
+    assert document.metadata == {"source": "data/source/a.pdf", "page": 3}
+    assert distance == pytest.approx(0.0, abs=1e-6)
+    assert store.get(ids=["a:4:0", "missing"]) == {
+        "ids": ["a:4:0"], "documents": ["text 4 é"], "metadatas": [{"source": "data/source/a.pdf", "page": 4}],
+    }
+    assert store.manifest() == MANIFEST
+
+
+def test_bm25_section_round_trip(tmp_path):
+    path = str(tmp_path / "index.snap")
+    write_snapshot(rows(), path, bm25=BM25)
+    index = SnapshotStore(path, verify=True).bm25_index()
+    assert index.doc_terms == BM25
+    assert [chunk_id for chunk_id, _score in index.search("Soup?")] == ["a:3:0"]
+    # Not backed by a file, there is nothing to reload.
+    index.refresh()
+    assert index.doc_terms == BM25
+
+
+def test_snapshot_without_manifest(tmp_path):
+    path = str(tmp_path / "index.snap")
+    write_snapshot(rows(), path)
+    store = SnapshotStore(path)
+    assert store.manifest() is None
+    with pytest.raises(SnapshotError, match="no BM25 section"):
+        store.bm25_index()
+
+
+def test_corrupt_snapshot_fails_verification(tmp_path):
+    path = tmp_path / "index.snap"
+    write_snapshot(rows(), str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match="checksum"):
+        verify_snapshot(str(path))
+
+
+def test_embedding_mismatch_fails_fast(tmp_path):
+    path = str(tmp_path / "index.snap")
+    write_snapshot(rows(), path, embedding_model="model-a")
+    with pytest.raises(SnapshotError, match="model-a"):
+        SnapshotStore(path, embedding_model="model-b")
+    store = SnapshotStore(path, embedding_model="model-a")
+    with pytest.raises(SnapshotError, match="dims"):
+        store.search_by_vector(np.ones(4, dtype=np.float32))
+
+
+def test_embedding_client_mismatch_fails_fast(tmp_path):
+    path = str(tmp_path / "index.snap")
+    write_snapshot(rows(), path, embedding_model="model-a", embedding_client_version="client-1")
+    with pytest.raises(SnapshotError, match="client-1"):
+        SnapshotStore(path, embedding_model="model-a", embedding_client_version="client-2")
+    assert len(SnapshotStore(path, embedding_model="model-a", embedding_client_version="client-1")) == 5
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    def full_disk(src, dst):
+        raise OSError("No space left on device")
+
+    # Fails once index.snap.tmp is complete, right before it would be renamed.
+    monkeypatch.setattr("snapshot.os.replace", full_disk)
+    with pytest.raises(OSError):
+        write_snapshot(rows(), str(tmp_path / "index.snap"))
+    assert list(tmp_path.iterdir()) == []
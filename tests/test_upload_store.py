@@ -0,0 +1,38 @@
+import io
+import os
+
+from manifest import apply_diff, diff_source_dir, load_manifest, save_manifest
+from upload_store import load_upload_index, store_upload
+
+
+def store(tmp_path, content, filename="report.pdf"):
+    return store_upload(
+        io.BytesIO(content), filename, str(tmp_path / "source"),
+        str(tmp_path / "uploads.json"), str(tmp_path / "manifest.json"),
+    )
+
+
+def ingest(tmp_path):
+    # What update_chroma records once the files are embedded.
+    manifest = load_manifest(str(tmp_path / "manifest.json"))
+    diff = diff_source_dir(manifest, str(tmp_path / "source"))
+    save_manifest(apply_diff(manifest, diff, {}), str(tmp_path / "manifest.json"))
+
+
+def test_same_content_is_stored_once_under_its_hash(tmp_path):
+    first = store(tmp_path, b"%PDF-1.4 one", "a.pdf")
+    second = store(tmp_path, b"%PDF-1.4 one", "b.PDF")
+    assert first.path == second.path
+    assert os.path.basename(first.path) == f"{first.sha256}.pdf"
+    assert os.listdir(tmp_path / "source") == [os.path.basename(first.path)]
+    assert load_upload_index(str(tmp_path / "uploads.json")) == {first.sha256: ["a.pdf", "b.PDF"]}
+
+
+def test_stored_but_not_ingested_file_is_not_a_duplicate(tmp_path):
+    # The first job failed or never ran: a re-upload must queue the file again.
+    assert not store(tmp_path, b"%PDF-1.4 one").duplicate
+    assert not store(tmp_path, b"%PDF-1.4 one").duplicate
+
+    ingest(tmp_path)
+    assert store(tmp_path, b"%PDF-1.4 one").duplicate
+    assert not store(tmp_path, b"%PDF-1.4 two").duplicate
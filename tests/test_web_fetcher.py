@@ -0,0 +1,37 @@
+import asyncio
+
+from web_fetcher import fetch_urls, load_web_cache, to_document
+
+
+def fetch(url, cache):
+    (result,) = asyncio.run(fetch_urls([url], cache))
+    return result
+
+
+def test_new_page_is_changed_with_its_validators(web_page):
+    result = fetch(web_page.url, load_web_cache("missing.json"))
+    assert result.status == "changed"
+    assert result.validators["etag"] == '"v1"'
+    document = to_document(result)
+    assert document.page_content == "MenuSoup of the day"
+    assert document.metadata == {"source": web_page.url, "title": "Menu", "language": "en"}
+
+
+def test_not_modified_page_is_unchanged_without_a_body(web_page):
+    first = fetch(web_page.url, {"urls": {}})
+    cache = {"urls": {web_page.url: first.validators}}
+    result = fetch(web_page.url, cache)
+    assert web_page.requests[-1]["If-None-Match"] == '"v1"'
+    assert (result.status, result.body, result.validators) == ("unchanged", None, {})
+
+
+def test_same_body_with_new_validators_is_unchanged(web_page):
+    cache = {"urls": {web_page.url: fetch(web_page.url, {"urls": {}}).validators}}
+    web_page.etag = '"v2"'
+    result = fetch(web_page.url, cache)
+    assert result.status == "unchanged"
+    assert result.validators["etag"] == '"v2"'
+
+    web_page.body = web_page.body.replace(b"Soup", b"Stew")
+    web_page.etag = '"v3"'
+    assert fetch(web_page.url, cache).status == "changed"
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+
+from collection_paths import collection_path, resolve_collection
+from manifest import MANIFEST_PATH, load_manifest
+
+DATA_SOURCE_PATH = "data/source"
+UPLOAD_INDEX_PATH = os.environ.get("UPLOAD_INDEX_PATH", "data/uploads.json")
+COPY_BLOCK_SIZE = 1024 * 1024
+
+_INDEX_LOCK = threading.Lock()
+
+
+def get_upload_paths(collection=None):
+    """(source directory, upload index, manifest) of a collection, each collection deduplicates on its own"""
+    collection = resolve_collection(collection)
+    return (
+        collection_path(collection, DATA_SOURCE_PATH, "source"),
+        collection_path(collection, UPLOAD_INDEX_PATH, "uploads.json"),
+        collection_path(collection, MANIFEST_PATH, "manifest.json"),
+    )
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    sha256: str
+    filename: str  # Name the file was uploaded under.
+    duplicate: bool  # Same content was already ingested, nothing new to do.
+
+
+def load_upload_index(index_path=UPLOAD_INDEX_PATH):
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_upload_index(index, index_path=UPLOAD_INDEX_PATH):
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def store_upload(fileobj, filename, save_path=DATA_SOURCE_PATH, index_path=UPLOAD_INDEX_PATH,
+                 manifest_path=MANIFEST_PATH):
+    """Stream an upload to save_path/<sha256>.<ext>, hashing it on the way
+
+    The file is never held in memory as a whole. Identical content maps to the same
+    path, so a re-upload of an ingested file is dropped before any parsing or embedding
+    and keeps its chunk IDs.
+    """
+    os.makedirs(save_path, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower() or ".bin"
+    digest = hashlib.sha256()
+    # Hidden temp name, so the source directory scan never picks up a partial upload.
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload-", suffix=".tmp", dir=save_path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in iter(lambda: fileobj.read(COPY_BLOCK_SIZE), b""):
+                digest.update(block)
+                f.write(block)
+        sha256 = digest.hexdigest()
+        path = os.path.join(save_path, f"{sha256}{extension}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Only the manifest says the file was ingested: a stored file whose job failed, or never ran
+    # because the process died, must be queued again.
+    entry = load_manifest(manifest_path)["files"].get(path)
+    duplicate = entry is not None and entry["sha256"] == sha256
+
+    # Keep the original names, the stored path only carries the hash.
+    with _INDEX_LOCK:
+        index = load_upload_index(index_path)
+        names = index.setdefault(sha256, [])
+        if filename not in names:
+            names.append(filename)
+            _save_upload_index(index, index_path)
+    return StoredUpload(path=path, sha256=sha256, filename=filename, duplicate=duplicate)
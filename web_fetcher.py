@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import httpx
+from langchain_core.documents import Document
+
+# Per URL: etag, last_modified, sha256 of the body and the chunk IDs it produced.
+WEB_CACHE_PATH = os.environ.get("WEB_CACHE_PATH", "data/web_cache.json")
+WEB_CACHE_VERSION = 1
+# Open connections across all hosts, and requests in flight to any one host.
+WEB_FETCH_CONCURRENCY = int(os.environ.get("WEB_FETCH_CONCURRENCY", "32"))
+WEB_PER_HOST_CONCURRENCY = int(os.environ.get("WEB_PER_HOST_CONCURRENCY", "4"))
+WEB_FETCH_TIMEOUT = float(os.environ.get("WEB_FETCH_TIMEOUT", "30"))
+USER_AGENT = "rag-web-ingest/1.0"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: str  # "changed", "unchanged" or "failed"
+    body: str = None  # Only set for changed pages.
+    validators: dict = field(default_factory=dict)
+    error: str = None
+
+
+def load_web_cache(cache_path=WEB_CACHE_PATH):
+    if not os.path.exists(cache_path):
+        return {"version": WEB_CACHE_VERSION, "urls": {}}
+    with open(cache_path, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    if cache.get("version") != WEB_CACHE_VERSION:
+        print(f"⚠️ Ignoring web cache {cache_path} with unknown version {cache.get('version')}")
+        return {"version": WEB_CACHE_VERSION, "urls": {}}
+    return cache
+
+
+def save_web_cache(cache, cache_path=WEB_CACHE_PATH):
+    # Same temp file and rename as the manifest, a crash never leaves it truncated.
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+def clear_web_cache(cache_path=WEB_CACHE_PATH):
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+
+async def _fetch_one(client, url, entry, host_limits):
+    headers = {}
+    # Conditional GET: an unchanged page costs a 304 and no body.
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    async with host_limits[urlsplit(url).netloc]:
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            return FetchResult(url, "failed", error=str(e) or type(e).__name__)
+
+    if response.status_code == 304:
+        return FetchResult(url, "unchanged")
+    if response.status_code >= 400:
+        return FetchResult(url, "failed", error=f"HTTP {response.status_code}")
+
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(response.content).hexdigest(),
+    }
+    # Servers without validators still send the same bytes for an unchanged page.
+    if validators["sha256"] == entry.get("sha256"):
+        return FetchResult(url, "unchanged", validators=validators)
+    return FetchResult(url, "changed", body=response.text, validators=validators)
+
+
+async def fetch_urls(urls, cache, concurrency=WEB_FETCH_CONCURRENCY, per_host=WEB_PER_HOST_CONCURRENCY):
+    """Fetch urls concurrently over one pooled client, with conditional GETs against cache"""
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    # No pool timeout: requests queued behind the connection limit wait instead of failing.
+    timeout = httpx.Timeout(WEB_FETCH_TIMEOUT, pool=None)
+    async with httpx.AsyncClient(
+        limits=limits, timeout=timeout, follow_redirects=True, headers={"User-Agent": USER_AGENT}
+    ) as client:
+        return await asyncio.gather(
+            *(_fetch_one(client, url, cache["urls"].get(url, {}), host_limits) for url in dict.fromkeys(urls))
+        )
+
+
+def to_document(result):
+    """Turn a fetched HTML page into a Document, with the same metadata WebBaseLoader sets"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(result.body, "html.parser")
+    metadata = {"source": result.url}
+    if soup.title and soup.title.string:
+        metadata["title"] = soup.title.string.strip()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description and description.get("content"):
+        metadata["description"] = description["content"]
+    html = soup.find("html")
+    if html and html.get("lang"):
+        metadata["language"] = html["lang"]
+    return Document(page_content=soup.get_text(), metadata=metadata)